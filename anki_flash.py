@@ -1,69 +1,463 @@
 import os
+import sys
+import glob
 import json
+import signal
+import argparse
+import inspect
 import time
 import re
-from mistralai import Mistral
-import tiktoken
-import pdfplumber
+import math
+import zlib
+import threading
+import multiprocessing
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from contextlib import closing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from dotenv import load_dotenv
 
+from cache_bundle import export_bundle, import_bundle
+from cache_store import MERGE_CONFLICT_RULES, file_sha256, make_cache_key, open_cache, open_extraction_cache
+from batch_job import BatchJobState, batch_custom_id, batch_request_line, parse_batch_output
+from dedup import DEDUP_THRESHOLD, CardDeduplicator, deduplicate_cards
+from hedging import HEDGE_MAX_EXTRA_FRACTION, HedgePolicy, call_hedged
+from metrics import RunMetrics
+from pdf_backends import DEFAULT_PDF_BACKEND, PDF_BACKENDS, get_pdf_backend
+from mistral_client import REQUEST_READ_TIMEOUT, MistralClientManager
+from rate_budget import SharedRateBudget, rate_limit_retry_after
+from run_journal import CardWriter, RunJournal
+
 ROOT_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
-CACHE_FILE = 'api_cache.json'
+CACHE_FILE = os.path.join(ROOT_DIRECTORY, 'api_cache.db')
+EXTRACTION_CACHE_FILE = os.path.join(ROOT_DIRECTORY, 'extraction_cache.db')
+# Zajednički budžet zahteva i tokena u minuti za sve procese koji koriste isti API ključ
+RATE_BUDGET_FILE = os.path.join(ROOT_DIRECTORY, 'rate_budget.db')
+# Ograničenja keša; None znači bez ograničenja
+CACHE_MAX_ENTRIES = None
+CACHE_MAX_AGE_DAYS = None
 
 load_dotenv()
-# Initialize Mistral client
-client = Mistral(api_key=os.getenv('MISTRAL_API_KEY'))
+# mistralai, tiktoken i pdfplumber se uvoze tek kad zatrebaju (ili u warm_up), da bi GUI krenuo odmah;
+# Mistral klijent daje get_client, a benchmark-ovi ga mogu zameniti dodelom u ``client``
+client = None
 
 model = "mistral-small-latest"
 
+# Povećati PROMPT_VERSION kad god se promeni tekst prompta, da se stari unosi u kešu ne bi koristili
+PROMPT_VERSION = 1
+
+SYSTEM_PROMPT = "Ti si asistent koji generiše flash kartice ISKLJUČIVO na srpskom jeziku (latinica). Ne smeš koristiti engleski jezik ni u jednom trenutku."
+
+USER_PROMPT_TEMPLATE = """Kreiraj Anki kartice na srpskom jeziku (latinica) iz ovog teksta. Fokusiraj se na ključne koncepte, definicije i važne detalje.
+
+            Pravila za kreiranje kartica:
+            1. Ne koristi numeraciju ili nabrajanje niti bilo kakvo formatiranje.
+            2. Ne koristi nikakve prefikse.
+            3. Pitanje treba da se završi znakom pitanja.
+            4. Ne koristi uglaste zagrade u odgovoru.
+            5. Svaka kartica treba da bude u jednom redu, sa pitanjem i odgovorom razdvojenim znakom '|'.
+            6. Kreiraj između {min_cards} i {max_cards} flash kartica, baziranih na tekstu koji ti je dat. VAŽNO: Obavezno generiši NAJMANJE {min_cards} kartica za ovaj deo teksta.
+            7. Svaka kartica MORA biti na srpskom jeziku, koristeći latinicu (sr-Latn). NIKAKO ne koristi engleski jezik.
+            8. Iskoristi sav dostupni tekst i pokrij sve važne informacije iz njega.
+
+            Format za svaku karticu:
+            Pitanje?|Odgovor
+            ILI
+            Objasni sledeći pojam 'ovde ubaci pojam':|Odgovor
+
+            Primer dobre kartice: Šta su osnovna sekvencijalna kola?|Osnovna sekvencijalna kola su SR-latch kolo i D-flip-flop.
+            Još jedan primer dobre kartice: Objasni kako se formira memorija sa većim m.|Memorija sa većim m se formira paralelnim vezivanjem nekoliko memorijskih čipova.
+
+            Tekst: {text}"""
+
+# Više malih delova teksta (krajevi PDF-ova, kratke lekcije) u jednom zahtevu; odgovor se
+# deli po oznakama delova, pa se kartice i keš i dalje vode po delu
+PACK_SECTION_MARKER = '### DEO {number}'
+_PACK_SECTION_PATTERN = re.compile(r'^[ \t]*(?:#+[ \t]*)?DEO[ \t]+(\d+)[ \t]*:?[ \t]*(?:\(.*\))?[ \t]*$',
+                                   re.IGNORECASE | re.MULTILINE)
+
+PACKED_PROMPT_TEMPLATE = """Kreiraj Anki kartice na srpskom jeziku (latinica) iz svakog od sledećih delova teksta posebno. Fokusiraj se na ključne koncepte, definicije i važne detalje.
+
+            Pravila za kreiranje kartica:
+            1. Ne koristi numeraciju ili nabrajanje niti bilo kakvo formatiranje.
+            2. Ne koristi nikakve prefikse.
+            3. Pitanje treba da se završi znakom pitanja.
+            4. Ne koristi uglaste zagrade u odgovoru.
+            5. Svaka kartica treba da bude u jednom redu, sa pitanjem i odgovorom razdvojenim znakom '|'.
+            6. Za svaki deo kreiraj onoliko kartica koliko je navedeno uz njegovu oznaku, samo iz teksta tog dela.
+            7. Svaka kartica MORA biti na srpskom jeziku, koristeći latinicu (sr-Latn). NIKAKO ne koristi engleski jezik.
+            8. Iskoristi sav dostupni tekst i pokrij sve važne informacije iz njega.
+            9. Za svaki deo prvo napiši njegovu oznaku (na primer {first_marker}) u posebnom redu, a ispod nje kartice tog dela. Ne izostavljaj nijedan deo.
+
+            Format za svaku karticu:
+            Pitanje?|Odgovor
+            ILI
+            Objasni sledeći pojam 'ovde ubaci pojam':|Odgovor
+
+            Primer dobre kartice: Šta su osnovna sekvencijalna kola?|Osnovna sekvencijalna kola su SR-latch kolo i D-flip-flop.
+
+            {sections}"""
+
+PACKED_SECTION_TEMPLATE = """{marker} (između {min_cards} i {max_cards} kartica)
+            Tekst: {text}"""
+
+# Dopunski zahtev kad deo teksta vrati manje od min_cards kartica: traže se samo kartice koje nedostaju,
+# a već postojeća pitanja se navode da se ne bi ponovila
+TOPUP_PROMPT_TEMPLATE = """Iz teksta ispod su već napravljene Anki kartice sa ovim pitanjima:
+            {questions}
+
+            Kreiraj još između {missing_cards} i {max_new_cards} NOVIH flash kartica na srpskom jeziku (latinica) iz istog teksta. Ne ponavljaj i ne preformuliši pitanja iznad, već pokrij koncepte, definicije i detalje koje ona ne pokrivaju.
+
+            Pravila za kreiranje kartica:
+            1. Ne koristi numeraciju ili nabrajanje niti bilo kakvo formatiranje.
+            2. Ne koristi nikakve prefikse.
+            3. Pitanje treba da se završi znakom pitanja.
+            4. Ne koristi uglaste zagrade u odgovoru.
+            5. Svaka kartica treba da bude u jednom redu, sa pitanjem i odgovorom razdvojenim znakom '|'.
+            6. Svaka kartica MORA biti na srpskom jeziku, koristeći latinicu (sr-Latn). NIKAKO ne koristi engleski jezik.
+
+            Format za svaku karticu:
+            Pitanje?|Odgovor
+
+            Tekst: {text}"""
+
+# Koliko zahteva ka API-ju sme istovremeno da bude u toku
+MAX_CONCURRENT_REQUESTS = 4
+# Najviše dopunskih zahteva po delu teksta koji je vratio premalo kartica; 0 isključuje dopunu
+TOPUP_MAX_ROUNDS = 1
+# Budžet (u tokenima teksta) za pakovanje malih delova u jedan zahtev; None isključuje pakovanje.
+# Pakuju se delovi manji od PACK_SMALL_CHUNK_FRACTION budžeta
+PACK_TOKEN_BUDGET = None
+PACK_SMALL_CHUNK_FRACTION = 0.5
+# Koliko delova po radnoj niti sme da bude poslato (ili gotovo a nezapisano) unapred; ograničava memoriju,
+# jer se sledeći PDF čita tek kad se red isprazni
+CHUNK_QUEUE_DEPTH = 4
+# Koliko sekundi čekamo između dve provere stanja batch posla
+BATCH_POLL_INTERVAL = 60
+# Jedan deljeni klijent sa keep-alive konekcijama; pravi se ponovo kad se promeni API ključ
+client_manager = MistralClientManager(pool_size=MAX_CONCURRENT_REQUESTS)
+# Broj procesa koji paralelno čitaju i dele PDF-ove (pdfplumber je čist Python i troši CPU)
+EXTRACTION_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+
+PDF_MIN_CARDS = 100
+PDF_MAX_CARDS = 200
+
+# Tekst se čita od treće strane (indeks 2) do prve strane sa pokaznim vežbama
+PDF_START_PAGE = 2
+PDF_STOP_PATTERNS = [r'Pokazne\s*[Vv]ežbe', r'Pokazna\s*[Vv]ežba']
+# Jedan regex za sve oznake, da se svaka strana pretražuje samo jednom
+_STOP_MARKER = re.compile('|'.join(f'(?:{pattern})' for pattern in PDF_STOP_PATTERNS))
+# Backend za izvlačenje teksta (pdf_backends.PDF_BACKENDS); menja se i sa --pdf-backend
+PDF_BACKEND = DEFAULT_PDF_BACKEND
+
+# Veličina dela teksta u karakterima (podrazumevani način) ili, ako je CHUNK_TOKEN_BUDGET
+# zadat, ukupan broj tokena po zahtevu (sistemski prompt + šablon + tekst)
+CHUNK_TARGET_SIZE = 4000
+CHUNK_TOKEN_BUDGET = None
+# Granice delova po sadržaju (rolling hash), da ispravka na jednoj strani ne pomeri sve kasnije delove.
+# Delovi su tada između MIN i MAX_FRACTION od CHUNK_TARGET_SIZE, a broj kartica se računa po dužini
+# dela umesto deljenjem PDF_*_CARDS: PDF od CONTENT_CHUNK_PDF_CHUNKS delova pune dužine dobija
+# PDF_MIN_CARDS-PDF_MAX_CARDS kartica, kao i u podrazumevanom načinu
+CONTENT_DEFINED_CHUNKS = False
+CONTENT_CHUNK_MIN_FRACTION = 0.5
+CONTENT_CHUNK_MAX_FRACTION = 2.0
+CONTENT_CHUNK_PDF_CHUNKS = 5
+
+# tiktoken nema Mistral tokenizer, pa brojimo gpt2 enkoderom; za latinicu sa dijakriticima
+# daje nešto više tokena od stvarnog, što je sigurnija strana za budžet
+TOKEN_ENCODING = 'gpt2'
+MODEL_CONTEXT_TOKENS = {
+    'mistral-small-latest': 32000,
+    'mistral-medium-latest': 32000,
+    'mistral-large-latest': 128000,
+    'open-mistral-nemo': 128000,
+}
+# Prostor koji ostavljamo za odgovor (kartice) kad se budžet računa iz konteksta modela
+COMPLETION_TOKEN_RESERVE = 8000
+# Procena tokena po kartici u odgovoru; njome se ograničava i koliko kartica jedan paket delova sme da traži
+CARD_TOKEN_ESTIMATE = 50
+# Procena dužine odgovora za budžet tokena u minuti (20 kartica); stvarni usage je ispravlja
+COMPLETION_TOKEN_ESTIMATE = 20 * CARD_TOKEN_ESTIMATE
+# Koliko puta se zahtev ponavlja posle 429 pre nego što se računa kao obična greška
+THROTTLE_MAX_RETRIES = 8
+
+
 class FlashcardGenerationError(Exception):
     pass
 
 class UnauthorizedError(Exception):
     pass
 
+class GenerationCancelled(Exception):
+    pass
+
+
+class CancellationToken:
+    """Shared stop flag checked between pages, between chunks and during retry backoff."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback()
+
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def wait(self, timeout):
+        """Sleep up to ``timeout`` seconds; returns True as soon as the token is cancelled."""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise GenerationCancelled("Generation was cancelled")
+
+    def add_callback(self, callback):
+        # Callback se poziva jednom, pri otkazivanju (odmah, ako je token već otkazan)
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+class _EventCancellationToken(CancellationToken):
+    # Token nad multiprocessing.Event-om, da bi otkazivanje stiglo i do procesa za čitanje PDF-ova
+    def __init__(self, event):
+        super().__init__()
+        self._event = event
+
+
+_worker_cancel_token = None
+
+
+def _init_extraction_worker(cancel_event):
+    global _worker_cancel_token
+    _worker_cancel_token = _EventCancellationToken(cancel_event)
+
+
+_rate_budget = None
+_rate_budget_lock = threading.Lock()
+
+
+def get_rate_budget():
+    global _rate_budget
+    if _rate_budget is None:
+        with _rate_budget_lock:
+            if _rate_budget is None:
+                _rate_budget = SharedRateBudget(RATE_BUDGET_FILE)
+    return _rate_budget
+
+
+def set_rate_limit(requests_per_minute=None, tokens_per_minute=None):
+    """Limit request starts and tokens per minute across all processes (see ``rate_budget.SharedRateBudget``).
+
+    None keeps the limit another process published for the same API key; 0 removes it.
+    """
+    get_rate_budget().set_limits(requests_per_minute, tokens_per_minute)
+
+
+_hedge_policy = None
+
+
+def set_hedging(max_extra_fraction=HEDGE_MAX_EXTRA_FRACTION):
+    """Duplicate requests that are slower than recent ones (see ``hedging.call_hedged``); None or 0 turns it off."""
+    global _hedge_policy
+    _hedge_policy = HedgePolicy(max_extra_fraction=max_extra_fraction) if max_extra_fraction else None
+
+
+def get_client():
+    if client is not None:
+        return client
+    return client_manager.get()
+
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder():
+    # Pravljenje enkodera učitava ceo BPE rečnik, pa ga pravimo samo jednom po procesu
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                import tiktoken
+                _encoder = tiktoken.get_encoding(TOKEN_ENCODING)
+    return _encoder
+
+
 def count_tokens(text):
-    encoding = tiktoken.encoding_for_model('gpt2')
-    return len(encoding.encode(text))
-
-def read_pdf(file_path):
-    with pdfplumber.open(file_path) as pdf:
-        text = ""
-        for page_num, page in enumerate(pdf.pages[2:], start=2):  # Počinjemo od treće strane (indeks 2)
-            page_text = page.extract_text()
+    return len(get_encoder().encode_ordinary(text))
+
+
+def prompt_overhead_tokens():
+    # Brojevi kartica u šablonu su najviše trocifreni, pa računamo sa PDF_MAX_CARDS
+    user_prompt = USER_PROMPT_TEMPLATE.format(min_cards=PDF_MAX_CARDS, max_cards=PDF_MAX_CARDS, text='')
+    return count_tokens(SYSTEM_PROMPT) + count_tokens(user_prompt)
+
+
+def default_chunk_token_budget():
+    return MODEL_CONTEXT_TOKENS.get(model, 32000) - COMPLETION_TOKEN_RESERVE
+
+
+def pdf_cache_key(file_path, pdf_backend=PDF_BACKEND):
+    backend = get_pdf_backend(pdf_backend)
+    return make_cache_key(file_sha256(file_path), backend.name, backend.version(), PDF_START_PAGE, PDF_STOP_PATTERNS)
+
+
+def load_extraction_cache():
+    return open_extraction_cache(EXTRACTION_CACHE_FILE)
+
+
+def warm_up(tokenizer=True):
+    """Import the heavy dependencies and load what the first run needs, so it does not pay for them.
+
+    Meant to run on a background thread right after the GUI window is
+    shown: imports the PDF backend, creates the Mistral client, loads the
+    tiktoken BPE (unless ``tokenizer`` is False) and reads the extraction
+    cache index into the OS page cache. Failures are ignored; the same
+    work is simply done again, and reported, when it is really needed.
+    """
+    steps = [_import_pdf_backend, get_client, _warm_extraction_cache]
+    if tokenizer:
+        steps.append(get_encoder)
+    for step in steps:
+        try:
+            step()
+        except Exception:
+            pass
+
+
+def _import_pdf_backend():
+    get_pdf_backend(PDF_BACKEND).version()
+
+
+def _warm_extraction_cache():
+    extraction_cache = load_extraction_cache()
+    try:
+        extraction_cache.warm_up()
+    finally:
+        extraction_cache.close()
+
+
+def _is_stop_page(page_text):
+    # Provera da li stranica sadrži "Pokazne vežbe"/"Pokazna vežba" (ili sa velikim V)
+    return _STOP_MARKER.search(page_text) is not None
+
+
+def iter_pdf_pages(file_path, extraction_cache=None, cancel_token=None, pdf_backend=PDF_BACKEND):
+    """Yield the text of every page that goes into the cards, one page at a time.
+
+    Reading starts at ``PDF_START_PAGE`` and stops before the first page
+    matching ``PDF_STOP_PATTERNS``, whichever ``pdf_backend`` (a name from
+    ``pdf_backends.PDF_BACKENDS``) extracts the text. Backends extract one
+    page at a time, so a long PDF never has more than one parsed page in
+    memory.
+    """
+    backend = get_pdf_backend(pdf_backend)
+    doc_key = None
+    cached_pages = {}
+    if extraction_cache is not None:
+        doc_key = pdf_cache_key(file_path, pdf_backend)
+        complete, cached_pages = extraction_cache.get_document(doc_key)
+        if complete:
+            # Nepromenjen PDF sa istim podešavanjima: PDF se uopšte ne otvara
+            for page_num in sorted(cached_pages):
+                page_text, is_stop = cached_pages.pop(page_num)
+                if is_stop:
+                    break
+                if page_text:
+                    yield page_text
+            return
+
+    # Počinjemo od treće strane (indeks 2); strane koje su već u kešu backend ne izvlači
+    with closing(backend.iter_pages(file_path, PDF_START_PAGE, skip=cached_pages)) as pages:
+        for page_num, page_text in pages:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            if page_num in cached_pages:
+                page_text, is_stop = cached_pages.pop(page_num)
+            else:
+                is_stop = bool(page_text) and _is_stop_page(page_text)
+                if extraction_cache is not None:
+                    extraction_cache.put_page(doc_key, page_num, page_text, is_stop)
             if page_text:
-                # Provera da li stranica sadrži "Pokazne vežbe" ili "Pokazne Vežbe"
-                if re.search(r'Pokazne\s*[Vv]ežbe', page_text):
+                if is_stop:
                     # Ako sadrži, prekidamo čitanje
                     break
-                elif   re.search(r'Pokazna\s*[Vv]ežba', page_text):
-                    break
-                else:
-                    text += page_text + "\n"
-        return text.strip()
+                yield page_text
+        if extraction_cache is not None:
+            extraction_cache.mark_complete(doc_key)
 
 
-def chunk_text(text, target_size, tolerance=0.1):
-    min_size = int(target_size * (1 - tolerance))
-    max_size = int(target_size * (1 + tolerance))
-    result = []
-    current_index = 0
+def read_pdf(file_path, extraction_cache=None, cancel_token=None, pdf_backend=PDF_BACKEND):
+    return '\n'.join(iter_pdf_pages(file_path, extraction_cache, cancel_token, pdf_backend)).strip()
+
+
+# Break tokens in the order chunk_text tries them, with their priority and the
+# pattern that finds every occurrence (lookahead so overlapping '\n\n' match too).
+# Sentence-ending punctuation only counts when followed by whitespace or end of text.
+BREAK_PATTERNS = [
+    ('\n\n', 4, re.compile(r'(?=\n\n)')),
+    ('\n', 3, re.compile(r'\n')),
+    ('.', 2, re.compile(r'\.(?=\s|\Z)')),
+    ('!', 2, re.compile(r'!(?=\s|\Z)')),
+    ('?', 2, re.compile(r'\?(?=\s|\Z)')),
+    (',', 1, re.compile(r',')),
+    (' ', 0, re.compile(r' ')),
+]
+
+
+class BreakIndex:
+    """Sorted offsets of every break token in ``text``, searched with bisect.
+
+    Offsets for a token are collected in one regex pass the first time that
+    token is needed, so text with plenty of line breaks never pays for
+    indexing every space.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._positions = [None] * len(BREAK_PATTERNS)
 
-    def find_break(start, end):
-        # Define break characters and their priorities
-        break_chars = [('\n\n', 4), ('\n', 3), ('.', 2), ('!', 2), ('?', 2), (',', 1), (' ', 0)]
+    def positions(self, token_index):
+        positions = self._positions[token_index]
+        if positions is None:
+            pattern = BREAK_PATTERNS[token_index][2]
+            positions = array('q', (m.start() for m in pattern.finditer(self.text)))
+            self._positions[token_index] = positions
+        return positions
 
-        for char, priority in break_chars:
-            for i in range(end, start - 1, -1):
-                if text[i:i + len(char)] == char:
-                    # For sentence-ending punctuation, ensure it's followed by a space or end of text
-                    if priority == 2 and i + 1 < len(text) and not text[i + 1].isspace():
-                        continue
-                    return i + len(char), priority
+    def find_break(self, start, end):
+        # Najveći prelom u [start, end] za prvi token (po prioritetu) koji ga uopšte ima
+        for token_index, (char, priority, _) in enumerate(BREAK_PATTERNS):
+            positions = self.positions(token_index)
+            i = bisect_right(positions, end) - 1
+            if i >= 0 and positions[i] >= start:
+                return positions[i] + len(char), priority
 
         # If all else fails, just break at the maximum point
         return end, -1
 
+
+def chunk_text(text, target_size, tolerance=0.1):
+    min_size = int(target_size * (1 - tolerance))
+    max_size = int(target_size * (1 + tolerance))
+    result = []
+    current_index = 0
+    break_index = BreakIndex(text)
+
     while current_index < len(text):
         if current_index + min_size >= len(text):
             # If the remaining text is shorter than min_size, just add it as the last chunk
@@ -74,11 +468,11 @@ def chunk_text(text, target_size, tolerance=0.1):
 
         end_index = min(current_index + max_size, len(text))
 
-        break_point, priority = find_break(current_index + min_size, end_index)
+        break_point, priority = break_index.find_break(current_index + min_size, end_index)
 
         # If we're breaking mid-word, try to find a better break point
         if priority < 0 and break_point < len(text) and not text[break_point].isspace():
-            better_break, _ = find_break(current_index, break_point)
+            better_break, _ = break_index.find_break(current_index, break_point)
             if better_break > current_index:
                 break_point = better_break
 
@@ -91,61 +485,298 @@ def chunk_text(text, target_size, tolerance=0.1):
     return result
 
 
+_gear_values = {}
+
+
+def _gear_value(char):
+    value = _gear_values.get(char)
+    if value is None:
+        value = _gear_values[char] = zlib.crc32(char.encode('utf-8'))
+    return value
+
+
+def chunk_text_content_defined(text, target_size, min_fraction=CONTENT_CHUNK_MIN_FRACTION,
+                               max_fraction=CONTENT_CHUNK_MAX_FRACTION):
+    """Split ``text`` at boundaries chosen by its content rather than by offsets from the start.
+
+    A gear rolling hash over the last 32 characters marks trigger points
+    (about one per ``target_size - min_size`` characters) and every chunk
+    ends at the first sentence or paragraph break after a trigger that is
+    at least ``min_size`` into it. An edit therefore only moves the
+    boundaries around it: the chunks after it come out byte for byte the
+    same and keep their cache entries. If there is no usable trigger within
+    ``max_size`` the chunk is cut like ``chunk_text`` cuts it, and the
+    boundaries fall back into step at the next trigger.
+    """
+    min_size = max(1, int(target_size * min_fraction))
+    max_size = max(min_size + 1, int(target_size * max_fraction))
+    # Prag poredi gornje bitove heša, koji zavise od svih 32 poslednja karaktera
+    bits = max(1, min(31, round(math.log2(max(2, target_size - min_size)))))
+    limit = 1 << (32 - bits)
+    triggers = array('q')
+    value = 0
+    for position, char in enumerate(text, 1):
+        value = ((value << 1) + _gear_value(char)) & 0xFFFFFFFF
+        if value < limit:
+            triggers.append(position)
+
+    break_index = BreakIndex(text)
+    # Kraj pasusa ili rečenice; pojedinačni '\n' je kod PDF teksta samo kraj reda
+    breaks = sorted(position + len(char)
+                    for token_index, (char, priority, _) in enumerate(BREAK_PATTERNS) if priority in (2, 4)
+                    for position in break_index.positions(token_index))
+    result = []
+    current_index = 0
+
+    while current_index < len(text):
+        if current_index + min_size >= len(text):
+            chunk = text[current_index:].strip()
+            if chunk:
+                result.append(chunk)
+            break
+
+        end_index = min(current_index + max_size, len(text))
+        break_point = None
+        i = bisect_left(triggers, current_index + min_size)
+        if i < len(triggers) and triggers[i] <= end_index:
+            j = bisect_left(breaks, triggers[i])
+            if j < len(breaks) and breaks[j] <= end_index:
+                break_point = breaks[j]
+        if break_point is None:
+            break_point, priority = break_index.find_break(current_index + min_size, end_index)
+            if priority < 0 and break_point < len(text) and not text[break_point].isspace():
+                better_break, _ = break_index.find_break(current_index, break_point)
+                if better_break > current_index:
+                    break_point = better_break
+
+        chunk = text[current_index:break_point].strip()
+        if chunk:
+            result.append(chunk)
+        current_index = break_point
+
+    return result
+
+
+def _token_segments(text, cut_positions):
+    segments = []
+    previous = 0
+    for position in cut_positions:
+        if position > previous:
+            segments.append((previous, position))
+            previous = position
+    if previous < len(text):
+        segments.append((previous, len(text)))
+    return segments
+
+
+def chunk_text_by_tokens(text, max_prompt_tokens=None):
+    """Split ``text`` so that every request (prompt + chunk) fits in ``max_prompt_tokens``.
+
+    The text is cut into segments at paragraph, line and sentence breaks, all
+    segments are encoded in one batch and then packed greedily. Segments that
+    are over budget on their own are re-split at commas and spaces, and as a
+    last resort at a fixed number of characters.
+    """
+    if max_prompt_tokens is None:
+        max_prompt_tokens = default_chunk_token_budget()
+    budget = max_prompt_tokens - prompt_overhead_tokens()
+    if budget <= 0:
+        raise ValueError(f"Token budget {max_prompt_tokens} is smaller than the prompt itself")
+
+    encoder = get_encoder()
+    break_index = BreakIndex(text)
+    result = []
+
+    def cut_positions(priorities, start, end):
+        positions = set()
+        for token_index, (char, priority, _) in enumerate(BREAK_PATTERNS):
+            if priority not in priorities:
+                continue
+            token_positions = break_index.positions(token_index)
+            for i in range(bisect_right(token_positions, start - 1), bisect_right(token_positions, end - len(char))):
+                positions.add(token_positions[i] + len(char))
+        return sorted(positions)
+
+    def pack(start, end, priorities):
+        segments = [(a + start, b + start)
+                    for a, b in _token_segments(text[start:end], [p - start for p in cut_positions(priorities, start, end)])]
+        counts = [len(tokens) for tokens in encoder.encode_ordinary_batch([text[a:b] for a, b in segments])]
+
+        chunk_start = None
+        chunk_tokens = 0
+        for (a, b), tokens in zip(segments, counts):
+            if tokens > budget:
+                if chunk_start is not None:
+                    emit(chunk_start, a)
+                    chunk_start = None
+                    chunk_tokens = 0
+                split_oversized(a, b, priorities)
+                continue
+            if chunk_start is not None and chunk_tokens + tokens > budget:
+                emit(chunk_start, a)
+                chunk_start = None
+                chunk_tokens = 0
+            if chunk_start is None:
+                chunk_start = a
+            chunk_tokens += tokens
+        if chunk_start is not None:
+            emit(chunk_start, end)
+
+    def split_oversized(start, end, priorities):
+        if priorities != (0, 1):
+            pack(start, end, (0, 1))
+            return
+        # Nema ni zareza ni razmaka u dovoljnoj blizini (formule, heks ispisi): sečemo po
+        # karakterima, sa prozorom procenjenim iz prosečnog broja karaktera po tokenu
+        step = max(1, (end - start) * budget // max(1, count_tokens(text[start:end])))
+        position = start
+        while position < end:
+            piece_end = min(end, position + step)
+            while piece_end - position > 1 and count_tokens(text[position:piece_end]) > budget:
+                piece_end = position + (piece_end - position) * 9 // 10
+            emit(position, piece_end)
+            position = piece_end
+
+    def emit(start, end):
+        chunk = text[start:end].strip()
+        if chunk:
+            result.append(chunk)
+
+    pack(0, len(text), (2, 3, 4))
+    return result
+
+
 def load_cache():
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, 'r') as f:
-            return json.load(f)
-    return {}
+    max_age_seconds = CACHE_MAX_AGE_DAYS * 24 * 3600 if CACHE_MAX_AGE_DAYS is not None else None
+    return open_cache(CACHE_FILE, max_entries=CACHE_MAX_ENTRIES, max_age_seconds=max_age_seconds)
 
 
-def save_cache(cache):
-    with open(CACHE_FILE, 'w') as f:
-        json.dump(cache, f)
+def flashcard_cache_key(text, min_cards, max_cards):
+    return make_cache_key(model, PROMPT_VERSION, min_cards, max_cards, text)
 
 
-def create_flashcards_with_rate_limit(text, cache, min_cards, max_cards):
+def create_flashcards_with_rate_limit(text, cache, min_cards, max_cards, cancel_token=None, metrics=None):
+    if metrics is None:
+        metrics = RunMetrics()
+    cache_key = flashcard_cache_key(text, min_cards, max_cards)
+    if cache is not None:
+        with metrics.stage('cache_lookup'):
+            cached = cache.get(cache_key)
+        if cached is not None:
+            metrics.increment('cache_hits')
+            return cached
+        metrics.increment('cache_misses')
 
-    if cache and text in cache:
-        return cache[text]
+    flashcards = request_flashcards(
+        USER_PROMPT_TEMPLATE.format(min_cards=min_cards, max_cards=max_cards, text=text), cancel_token, metrics)
+    flashcards = top_up_flashcards(text, flashcards, min_cards, max_cards, cancel_token, metrics)
+    if cache is not None:
+        cache.put(cache_key, flashcards)
+    return flashcards
 
-    max_retries = 3
 
-    for attempt in range(max_retries):
-        try:
-            chat_response = client.chat.complete(
-                model=model,
-                messages=[
-                    {"role": "system",
-                     "content": "Ti si asistent koji generiše flash kartice ISKLJUČIVO na srpskom jeziku (latinica). Ne smeš koristiti engleski jezik ni u jednom trenutku."},
-                    {"role": "user", "content": f"""Kreiraj Anki kartice na srpskom jeziku (latinica) iz ovog teksta. Fokusiraj se na ključne koncepte, definicije i važne detalje.
+def top_up_flashcards(text, flashcards, min_cards, max_cards, cancel_token=None, metrics=None,
+                      max_rounds=TOPUP_MAX_ROUNDS):
+    """Ask for the missing cards when a response has fewer than ``min_cards`` valid cards.
 
-            Pravila za kreiranje kartica:
-            1. Ne koristi numeraciju ili nabrajanje niti bilo kakvo formatiranje.
-            2. Ne koristi nikakve prefikse.
-            3. Pitanje treba da se završi znakom pitanja.
-            4. Ne koristi uglaste zagrade u odgovoru.
-            5. Svaka kartica treba da bude u jednom redu, sa pitanjem i odgovorom razdvojenim znakom '|'.
-            6. Kreiraj između {min_cards} i {max_cards} flash kartica, baziranih na tekstu koji ti je dat. VAŽNO: Obavezno generiši NAJMANJE {min_cards} kartica za ovaj deo teksta.
-            7. Svaka kartica MORA biti na srpskom jeziku, koristeći latinicu (sr-Latn). NIKAKO ne koristi engleski jezik.
-            8. Iskoristi sav dostupni tekst i pokrij sve važne informacije iz njega.
+    Only the shortfall is requested, with the questions already generated
+    listed as exclusions, and the new cards are appended to ``flashcards``.
+    That is far cheaper than regenerating the chunk. Returns the merged
+    response; a chunk still short after ``max_rounds`` is counted in the
+    ``short_chunks`` metric.
+    """
+    if metrics is None:
+        metrics = RunMetrics()
+    cards = list(iter_processed_cards(flashcards or ''))
+    for _ in range(max_rounds):
+        if len(cards) >= min_cards:
+            break
+        questions = '\n            '.join(card.split('|', 1)[0] for card in cards) or '(nema)'
+        response = request_flashcards(TOPUP_PROMPT_TEMPLATE.format(
+            questions=questions, missing_cards=min_cards - len(cards), max_new_cards=max(1, max_cards - len(cards)),
+            text=text), cancel_token, metrics)
+        new_cards = list(iter_processed_cards(response))
+        metrics.increment('topup_requests')
+        metrics.increment('topup_cards', len(new_cards))
+        if not new_cards:
+            break
+        cards.extend(new_cards)
+        flashcards = (flashcards.rstrip('\n') + '\n' if flashcards else '') + '\n'.join(new_cards)
+    if len(cards) < min_cards:
+        metrics.increment('short_chunks')
+    return flashcards
 
-            Format za svaku karticu:
-            Pitanje?|Odgovor
-            ILI
-            Objasni sledeći pojam 'ovde ubaci pojam':|Odgovor
 
-            Primer dobre kartice: Šta su osnovna sekvencijalna kola?|Osnovna sekvencijalna kola su SR-latch kolo i D-flip-flop.
-            Još jedan primer dobre kartice: Objasni kako se formira memorija sa većim m.|Memorija sa većim m se formira paralelnim vezivanjem nekoliko memorijskih čipova.
+def chat_messages(user_prompt):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def estimate_request_tokens(messages):
+    # Budžet tokena u minuti broji i prompt i odgovor; odgovor procenjujemo, a posle ga ispravlja usage.
+    # Zove se samo kad je ograničenje tokena uključeno, jer tiktoken pri prvom pozivu preuzima BPE rečnik
+    return sum(count_tokens(message['content']) for message in messages) + COMPLETION_TOKEN_ESTIMATE
+
+
+def request_flashcards(user_prompt, cancel_token=None, metrics=None):
+    """Send one chat request with the system prompt, retrying with exponential backoff.
+
+    Requests draw from the shared rate budget first. A 429 pauses every
+    process on the same API key for Retry-After and is retried up to
+    ``THROTTLE_MAX_RETRIES`` times without using up the regular retries.
+    """
+    if metrics is None:
+        metrics = RunMetrics()
+    max_retries = 3
+    budget = get_rate_budget()
+    messages = chat_messages(user_prompt)
+    # Bez ograničenja tokena nema procene; ako ga drugi proces uvede usred rada, usage se naplati posle odgovora
+    estimated_tokens = estimate_request_tokens(messages) if budget.current_limits()[1] else 0
+
+    attempt = 0
+    throttles = 0
+    while True:
+        with metrics.stage('rate_limit_wait'):
+            budget.acquire(estimated_tokens, cancel_token)
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        request_start = time.perf_counter()
+        try:
+            if _hedge_policy is not None:
+                chat_response = call_hedged(lambda: get_client().chat.complete(model=model, messages=messages),
+                                            _hedge_policy, cancel_token, metrics,
+                                            hedge_call=lambda: _hedge_request(messages, estimated_tokens,
+                                                                              cancel_token))
+            else:
+                chat_response = get_client().chat.complete(model=model, messages=messages)
 
-            Tekst: {text}"""}
-                ]
-            )
+            latency = time.perf_counter() - request_start
+            metrics.add_stage_time('api', latency)
+            metrics.observe('request_latency', latency)
+            metrics.increment('requests')
+            usage = getattr(chat_response, 'usage', None)
+            used_tokens = None
+            if usage is not None:
+                metrics.increment('prompt_tokens', usage.prompt_tokens or 0)
+                metrics.increment('completion_tokens', usage.completion_tokens or 0)
+                used_tokens = (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+            budget.record_success(estimated_tokens, used_tokens)
 
-            flashcards = chat_response.choices[0].message.content
-            cache[text] = flashcards
-            save_cache(cache)
-            return flashcards
+            return chat_response.choices[0].message.content
+        except GenerationCancelled:
+            raise
         except Exception as e:
+            metrics.add_stage_time('api', time.perf_counter() - request_start)
+            retry_after = rate_limit_retry_after(e)
+            if retry_after is not None and throttles < THROTTLE_MAX_RETRIES:
+                # Server je prepunjen: pauzu i sporiji tempo preuzimaju svi procesi, pa se čeka u acquire
+                throttles += 1
+                metrics.increment('throttled')
+                budget.record_throttle(retry_after)
+                continue
+            metrics.increment('request_errors')
             error_message = str(e).lower()
             if "unauthorized" in error_message or "authentication" in error_message:
                 raise UnauthorizedError("API key is invalid or unauthorized")
@@ -153,56 +784,684 @@ def create_flashcards_with_rate_limit(text, cache, min_cards, max_cards):
             if attempt == max_retries - 1:
                 raise FlashcardGenerationError(
                     f"Failed to generate flashcards after {max_retries} attempts. Last error: {str(e)}")
-            time.sleep(2 ** attempt)  # Exponential backoff
+            metrics.increment('retries')
+            # Exponential backoff; otkazivanje prekida čekanje odmah
+            with metrics.stage('retry_backoff'):
+                if cancel_token is not None:
+                    if cancel_token.wait(2 ** attempt):
+                        cancel_token.raise_if_cancelled()
+                else:
+                    time.sleep(2 ** attempt)
+            attempt += 1
+
+
+def _hedge_request(messages, estimated_tokens, cancel_token=None):
+    # Duplikat je novi zahtev, pa i on troši zajednički budžet
+    get_rate_budget().acquire(estimated_tokens, cancel_token)
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    return get_client().chat.complete(model=model, messages=messages)
+
+
+def split_packed_response(response, section_count):
+    """Split a packed response at its section markers; sections the model left out come back as None."""
+    sections = [None] * section_count
+    matches = list(_PACK_SECTION_PATTERN.finditer(response))
+    for i, match in enumerate(matches):
+        number = int(match.group(1))
+        if not 1 <= number <= section_count:
+            continue
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(response)
+        body = response[match.end():end].strip()
+        sections[number - 1] = body if sections[number - 1] is None else sections[number - 1] + '\n' + body
+    return sections
+
+
+def create_packed_flashcards(items, cache, cancel_token=None, metrics=None):
+    """Generate cards for several small chunks with one request.
+
+    ``items`` is a list of ``(text, min_cards, max_cards)``; the result has
+    one flashcard string per item. Every chunk is looked up and stored in
+    the cache under its own key, exactly as if it had been sent alone, and
+    chunks whose section is missing from the response are sent alone.
+    """
+    if metrics is None:
+        metrics = RunMetrics()
+    results = [None] * len(items)
+    misses = []
+    for index, (text, min_cards, max_cards) in enumerate(items):
+        if cache is not None:
+            with metrics.stage('cache_lookup'):
+                cached = cache.get(flashcard_cache_key(text, min_cards, max_cards))
+            if cached is not None:
+                metrics.increment('cache_hits')
+                results[index] = cached
+                continue
+            metrics.increment('cache_misses')
+        misses.append(index)
+
+    if len(misses) > 1:
+        sections = '\n\n            '.join(
+            PACKED_SECTION_TEMPLATE.format(marker=PACK_SECTION_MARKER.format(number=number), min_cards=items[index][1],
+                                           max_cards=items[index][2], text=items[index][0])
+            for number, index in enumerate(misses, start=1))
+        response = request_flashcards(
+            PACKED_PROMPT_TEMPLATE.format(first_marker=PACK_SECTION_MARKER.format(number=1), sections=sections),
+            cancel_token, metrics)
+        metrics.increment('packed_requests')
+        metrics.increment('packed_chunks', len(misses))
+        for index, section in zip(misses, split_packed_response(response, len(misses))):
+            if not section:
+                continue
+            text, min_cards, max_cards = items[index]
+            section = top_up_flashcards(text, section, min_cards, max_cards, cancel_token, metrics)
+            if cache is not None:
+                cache.put(flashcard_cache_key(text, min_cards, max_cards), section)
+            results[index] = section
+
+    for index in misses:
+        if results[index] is None:
+            if len(misses) > 1:
+                metrics.increment('packed_fallbacks')
+            text, min_cards, max_cards = items[index]
+            # Keš je za ovaj deo već proveren
+            results[index] = create_flashcards_with_rate_limit(text, None, min_cards, max_cards, cancel_token,
+                                                               metrics)
+            if cache is not None:
+                cache.put(flashcard_cache_key(text, min_cards, max_cards), results[index])
+    return results
+
+
+def chunk_card_range(chunk_index, chunk_count, pdf_min_cards=PDF_MIN_CARDS, pdf_max_cards=PDF_MAX_CARDS):
+    # Calculate min and max cards for this chunk
+    chunk_min_cards = max(1, pdf_min_cards // chunk_count)
+    chunk_max_cards = max(chunk_min_cards, pdf_max_cards // chunk_count)
+
+    # Adjust for last chunk to ensure we meet the minimum
+    if chunk_index == chunk_count - 1:
+        chunk_min_cards = max(chunk_min_cards, pdf_min_cards - (chunk_count - 1) * chunk_min_cards)
+        chunk_max_cards = max(chunk_max_cards, pdf_max_cards - (chunk_count - 1) * chunk_max_cards)
+
+    return chunk_min_cards, chunk_max_cards
+
+
+def chunk_card_ranges(chunks, content_defined=False):
+    """``(min_cards, max_cards)`` for every chunk of one PDF.
+
+    Content-defined chunks get a range from their own length, so a chunk
+    that did not change keeps the same cache key even when an edit
+    elsewhere changed how many chunks the PDF has.
+    """
+    if not content_defined:
+        return [chunk_card_range(chunk_index, len(chunks)) for chunk_index in range(len(chunks))]
+    ranges = []
+    for chunk in chunks:
+        # Udeo tipičnog PDF-a koji ovaj deo pokriva
+        share = len(chunk) / (CHUNK_TARGET_SIZE * CONTENT_CHUNK_PDF_CHUNKS)
+        chunk_min_cards = max(1, round(PDF_MIN_CARDS * share))
+        ranges.append((chunk_min_cards, max(chunk_min_cards, round(PDF_MAX_CARDS * share))))
+    return ranges
 
 
-def process_multiple_pdfs(pdf_paths, progress_callback=None):
-    all_flashcards = []
+def extract_and_chunk(pdf_path, chunk_tokens=None, extraction_cache_file=None, cancel_token=None,
+                      content_defined=False, pdf_backend=PDF_BACKEND):
+    """Read one PDF and split it into chunks; runs inside an extraction worker process.
+
+    Returns ``(chunks, timings)``, where ``timings`` holds the seconds spent
+    in the 'extraction' and 'chunking' stages.
+    """
+    if cancel_token is None:
+        cancel_token = _worker_cancel_token
+    extraction_start = time.perf_counter()
+    extraction_cache = open_extraction_cache(extraction_cache_file or EXTRACTION_CACHE_FILE)
+    try:
+        text = read_pdf(pdf_path, extraction_cache, cancel_token, pdf_backend)
+    finally:
+        extraction_cache.close()
+    chunking_start = time.perf_counter()
+    if chunk_tokens:
+        chunks = chunk_text_by_tokens(text, chunk_tokens)
+    elif content_defined:
+        chunks = chunk_text_content_defined(text, target_size=CHUNK_TARGET_SIZE)
+    else:
+        chunks = chunk_text(text, target_size=CHUNK_TARGET_SIZE)
+    timings = {'extraction': chunking_start - extraction_start, 'chunking': time.perf_counter() - chunking_start}
+    return chunks, timings
+
+
+def _accepts_metrics(callback):
+    # Stari callback-ovi primaju samo četiri argumenta; metrike šaljemo samo onima koji ih traže
+    try:
+        parameters = inspect.signature(callback).parameters
+    except (TypeError, ValueError):
+        return False
+    return 'metrics' in parameters or any(p.kind == p.VAR_KEYWORD for p in parameters.values())
+
+
+def journal_path_for(output_path):
+    return output_path + '.journal'
+
+
+def job_id_for(pdf_paths, chunk_tokens, content_defined=False, pdf_backend=DEFAULT_PDF_BACKEND):
+    # Isti PDF-ovi (putanja, veličina, vreme izmene) sa istim podešavanjima čine isti posao
+    files = []
+    for pdf_path in pdf_paths:
+        stat = os.stat(pdf_path)
+        files.append([os.path.abspath(pdf_path), stat.st_size, stat.st_mtime])
+    parts = ['job', files, chunk_tokens, CHUNK_TARGET_SIZE, PDF_MIN_CARDS, PDF_MAX_CARDS, model, PROMPT_VERSION]
+    if content_defined:
+        # Dodaje se samo kad je uključeno, da dnevnici postojećih poslova ostanu važeći
+        parts += ['content_defined', CONTENT_CHUNK_MIN_FRACTION, CONTENT_CHUNK_MAX_FRACTION, CONTENT_CHUNK_PDF_CHUNKS]
+    if pdf_backend != DEFAULT_PDF_BACKEND:
+        parts += ['pdf_backend', pdf_backend]
+    return make_cache_key(*parts)
+
+
+def iter_flashcards(pdf_paths, progress_callback=None, max_concurrent_requests=MAX_CONCURRENT_REQUESTS,
+                    chunk_tokens=CHUNK_TOKEN_BUDGET, extraction_workers=EXTRACTION_WORKERS, journal_path=None,
+                    cancel_token=None, metrics=None, pack_tokens=PACK_TOKEN_BUDGET,
+                    content_defined_chunks=CONTENT_DEFINED_CHUNKS, pdf_backend=PDF_BACKEND):
+    """Generate cards for ``pdf_paths``, yielding ``(pdf_index, chunk_index, cards)`` in PDF and chunk order.
+
+    This is the streaming core of ``process_multiple_pdfs`` (arguments are
+    described there); ``cards`` are the post-processed cards of one chunk,
+    not deduplicated.
+
+    Memory does not grow with the number of PDFs: at most
+    ``CHUNK_QUEUE_DEPTH * max_concurrent_requests`` chunks are in flight or
+    finished but not yet yielded, the next PDF is only read once the chunks
+    waiting to be sent drop below that, and a chunk is forgotten as soon as
+    it has been yielded. After a cancellation the chunks that did finish
+    are still yielded, in order, skipping the gaps.
+    """
+    if cancel_token is None:
+        cancel_token = CancellationToken()
+    if metrics is None:
+        metrics = RunMetrics()
+    # Duplikati sporih zahteva traže dodatne konekcije
+    client_manager.ensure_pool_size(max_concurrent_requests * (2 if _hedge_policy is not None else 1))
+    send_metrics = progress_callback is not None and _accepts_metrics(progress_callback)
     total_pdfs = len(pdf_paths)
-    all_chunks = []
-    cache = load_cache()
-    # Chunking stage
-    for pdf_index, pdf_path in enumerate(pdf_paths):
-        if progress_callback:
-            progress_callback(pdf_path, pdf_index, total_pdfs, 'chunking')
+    metrics.set_gauge('pdfs_total', total_pdfs)
+    content_defined = content_defined_chunks and not chunk_tokens
+    journal = (RunJournal(journal_path, job_id_for(pdf_paths, chunk_tokens, content_defined, pdf_backend))
+               if journal_path else None)
+    # PDF-ovi čiji su delovi već zapisani u dnevniku ne čitaju se ponovo
+    resumed_pdfs = set(journal.chunks) if journal is not None else set()
+    progress = {'chunked_pdfs': 0, 'total_chunks': 0, 'processed_chunks': 0, 'queued_chunks': 0, 'ahead': 0}
+    # Delovi koji se šalju ili su gotovi a nisu predati; kad ih je ovoliko, ne šaljemo nove i ne čitamo PDF-ove
+    window = max(1, max_concurrent_requests) * CHUNK_QUEUE_DEPTH
 
-        text = read_pdf(pdf_path)
-        chunks = chunk_text(text, target_size=4000)
-        all_chunks.append((pdf_path, chunks))
+    if extraction_workers > 1 and total_pdfs > 1:
+        cancel_event = multiprocessing.Event()
+        cancel_token.add_callback(cancel_event.set)
+        extraction_slots = min(extraction_workers, total_pdfs)
+        extraction_executor = ProcessPoolExecutor(max_workers=extraction_slots,
+                                                  initializer=_init_extraction_worker, initargs=(cancel_event,))
+        extraction_token = None
+    else:
+        # Jedna nit je dovoljna da se čitanje PDF-ova preklopi sa čekanjem na API
+        extraction_slots = 1
+        extraction_executor = ThreadPoolExecutor(max_workers=1)
+        extraction_token = cancel_token
+    # Broj radnih niti ograničava broj zahteva koji su istovremeno u toku
+    generation_executor = ThreadPoolExecutor(max_workers=max(1, max_concurrent_requests))
+    cache = load_cache()
+    pending = {}
+    packed_members = {}
+    pack = {'items': [], 'members': [], 'tokens': 0, 'cards': 0}
+    small_chunk_tokens = pack_tokens * PACK_SMALL_CHUNK_FRACTION if pack_tokens else 0
+    pack_max_cards = COMPLETION_TOKEN_RESERVE // CARD_TOKEN_ESTIMATE
+    # PDF-ovi se predaju generisanju redom, pa je i red delova za slanje uvek po redosledu špila
+    extracting = set()
+    extracted = {}
+    backlog = deque()
+    chunk_counts = {}
+    finished = {}
+    position = {'next_extraction': 0, 'next_ready': 0, 'pdf': 0, 'chunk': 0}
 
-    # Signal end of chunking stage
-    if progress_callback:
-        progress_callback(None, total_pdfs, total_pdfs, 'chunking_complete')
+    # Etape se prepliću, jer generisanje počinje čim je prvi PDF podeljen:
+    # 'chunking' posle svakog podeljenog PDF-a (current_index = podeljeni PDF-ovi - 1),
+    # 'chunking_complete' jednom, posle poslednjeg, i 'generating' posle svakog gotovog dela
+    # (current_index = gotovi delovi - 1, total = do sada poznati delovi, raste dok se deljenje ne završi)
+    def report(pdf_path, current_index, total, stage):
+        if not progress_callback:
+            return
+        if send_metrics:
+            result = progress_callback(pdf_path, current_index, total, stage, metrics=metrics.snapshot())
+        else:
+            result = progress_callback(pdf_path, current_index, total, stage)
+        if result is False:
+            cancel_token.cancel()
 
-    # Generating stage
-    total_chunks = sum(len(chunks) for _, chunks in all_chunks)
-    processed_chunks = 0
+    def flush_pack():
+        if not pack['items']:
+            return
+        pack_future = generation_executor.submit(create_packed_flashcards, pack['items'], cache, cancel_token,
+                                                 metrics)
+        first_pdf, first_chunk = pack['members'][0]
+        pending[pack_future] = ('packed', first_pdf, first_chunk)
+        packed_members[pack_future] = pack['members']
+        pack.update(items=[], members=[], tokens=0, cards=0)
 
-    for pdf_path, chunks in all_chunks:
-        pdf_min_cards = 100
-        pdf_max_cards = 200
-        chunk_count = len(chunks)
+    def chunks_ready(pdf_index, chunks, resumed=False):
+        pdf_path = pdf_paths[pdf_index]
+        if journal is not None and not resumed:
+            journal.record_chunks(pdf_index, pdf_path, chunks)
+        chunk_counts[pdf_index] = len(chunks)
+        card_ranges = chunk_card_ranges(chunks, content_defined)
+        progress['chunked_pdfs'] += 1
+        progress['total_chunks'] += len(chunks)
+        metrics.set_gauge('pdfs_chunked', progress['chunked_pdfs'])
+        report(pdf_path, progress['chunked_pdfs'] - 1, total_pdfs, 'chunking')
 
         for chunk_index, chunk in enumerate(chunks):
+            if journal is not None and (pdf_index, chunk_index) in journal.cards:
+                # Delovi iz dnevnika se ne računaju u ETA, jer ne koštaju ništa
+                backlog.append((pdf_index, chunk_index, None, journal.cards.pop((pdf_index, chunk_index))))
+                continue
+            progress['queued_chunks'] += 1
+            backlog.append((pdf_index, chunk_index, chunk, card_ranges[chunk_index]))
+        metrics.set_gauge('chunks_total', progress['queued_chunks'])
+
+        if progress['chunked_pdfs'] == total_pdfs:
+            report(None, total_pdfs, total_pdfs, 'chunking_complete')
+
+    def ready_pdfs():
+        while position['next_ready'] < total_pdfs:
+            pdf_index = position['next_ready']
+            if pdf_index in resumed_pdfs:
+                chunks_ready(pdf_index, journal.chunks.pop(pdf_index), resumed=True)
+            elif pdf_index in extracted:
+                chunks_ready(pdf_index, extracted.pop(pdf_index))
+            else:
+                break
+            position['next_ready'] += 1
+
+    def send(pdf_index, chunk_index, chunk, payload):
+        progress['ahead'] += 1
+        if chunk is None:
+            metrics.increment('chunks_resumed')
+            cards_ready(pdf_index, chunk_index, payload, resumed=True)
+            return
+        chunk_min_cards, chunk_max_cards = payload
+        metrics.mark_generation_started()
+        # Deo koji sam traži skoro ceo odgovor (npr. kratko predavanje od jednog dela) ide zasebno
+        if small_chunk_tokens and chunk_max_cards <= pack_max_cards // 2:
+            chunk_tokens_count = count_tokens(chunk)
+            if chunk_tokens_count < small_chunk_tokens:
+                # Paket je ograničen i tekstom i brojem traženih kartica, da odgovor ne bude odsečen
+                if (pack['tokens'] + chunk_tokens_count > pack_tokens
+                        or pack['cards'] + chunk_max_cards > pack_max_cards):
+                    flush_pack()
+                pack['items'].append((chunk, chunk_min_cards, chunk_max_cards))
+                pack['members'].append((pdf_index, chunk_index))
+                pack['tokens'] += chunk_tokens_count
+                pack['cards'] += chunk_max_cards
+                return
+        card_future = generation_executor.submit(
+            create_flashcards_with_rate_limit, chunk, cache, chunk_min_cards, chunk_max_cards, cancel_token,
+            metrics)
+        pending[card_future] = ('cards', pdf_index, chunk_index)
+
+    def feed():
+        while backlog and progress['ahead'] < window:
+            send(*backlog.popleft())
+        # Nepun paket čeka još malih delova samo dok ima mesta i dok ima PDF-ova za čitanje
+        if progress['ahead'] >= window or progress['chunked_pdfs'] == total_pdfs:
+            flush_pack()
+        while (position['next_extraction'] < total_pdfs and len(extracting) + len(extracted) < extraction_slots
+               and len(backlog) < window):
+            pdf_index = position['next_extraction']
+            position['next_extraction'] += 1
+            if pdf_index in resumed_pdfs:
+                continue
+            future = extraction_executor.submit(extract_and_chunk, pdf_paths[pdf_index], chunk_tokens,
+                                                EXTRACTION_CACHE_FILE, extraction_token, content_defined, pdf_backend)
+            pending[future] = ('chunks', pdf_index, None)
+            extracting.add(pdf_index)
+
+    def cards_ready(pdf_index, chunk_index, flashcards, resumed=False):
+        if journal is not None and not resumed:
+            journal.record_cards(pdf_index, chunk_index, flashcards)
+        with metrics.stage('post_processing'):
+            cards = list(iter_processed_cards(flashcards)) if flashcards else []
+        finished[(pdf_index, chunk_index)] = cards
+        metrics.increment('cards', len(cards))
+        if not resumed:
+            metrics.increment('chunks_done')
+        progress['processed_chunks'] += 1
+        report(pdf_paths[pdf_index], progress['processed_chunks'] - 1, progress['total_chunks'], 'generating')
+
+    def ordered_cards():
+        while position['pdf'] in chunk_counts:
+            pdf_index = position['pdf']
+            if position['chunk'] >= chunk_counts[pdf_index]:
+                del chunk_counts[pdf_index]
+                position['pdf'] += 1
+                position['chunk'] = 0
+                continue
+            key = (pdf_index, position['chunk'])
+            if key not in finished:
+                break
+            position['chunk'] += 1
+            progress['ahead'] -= 1
+            yield pdf_index, key[1], finished.pop(key)
+
+    try:
+        if not pdf_paths:
+            report(None, 0, 0, 'chunking_complete')
+
+        while not cancel_token.is_cancelled():
+            ready_pdfs()
+            feed()
+            if not pending:
+                # Bez poslova u toku ostaju samo delovi iz dnevnika koji čekaju mesto u redu
+                yield from ordered_cards()
+                if backlog or position['next_ready'] < total_pdfs:
+                    continue
+                break
+            # Kratak timeout, da bi se otkazivanje primetilo i dok nijedan posao ne završava
+            done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            # Obrađujemo završene poslove po redosledu predaje, da bi napredak bio predvidiv
+            for future in sorted(done, key=lambda f: (pending[f][1], -1 if pending[f][2] is None else pending[f][2])):
+                kind, pdf_index, chunk_index = pending.pop(future)
+                if kind == 'chunks':
+                    extracting.discard(pdf_index)
+                try:
+                    result = future.result()
+                except GenerationCancelled:
+                    continue
+                if kind == 'chunks':
+                    chunks, timings = result
+                    for stage, seconds in timings.items():
+                        metrics.add_stage_time(stage, seconds)
+                    extracted[pdf_index] = chunks
+                elif kind == 'packed':
+                    for (member_pdf, member_chunk), flashcards in zip(packed_members.pop(future), result):
+                        cards_ready(member_pdf, member_chunk, flashcards)
+                else:
+                    cards_ready(pdf_index, chunk_index, result)
+            yield from ordered_cards()
+
+        if cancel_token.is_cancelled():
+            # Delovi završeni posle prvog nezavršenog se ipak predaju, redom i bez rupa
+            for key in sorted(finished):
+                yield key[0], key[1], finished.pop(key)
+    except BaseException:
+        cancel_token.cancel()
+        if journal is not None:
+            journal.close()
+        raise
+    else:
+        if journal is not None:
+            if cancel_token.is_cancelled():
+                journal.close()
+            else:
+                journal.finish()
+    finally:
+        metrics.finish()
+        # Zahtevi koji još nisu krenuli se odbacuju; ako je posao prekinut, ne čekamo ni one u toku
+        stopped = cancel_token.is_cancelled()
+        generation_executor.shutdown(wait=not stopped, cancel_futures=True)
+        extraction_executor.shutdown(wait=not stopped, cancel_futures=True)
+        if not stopped:
+            cache.close()
+
+
+def process_multiple_pdfs(pdf_paths, progress_callback=None, max_concurrent_requests=MAX_CONCURRENT_REQUESTS,
+                          chunk_tokens=CHUNK_TOKEN_BUDGET, extraction_workers=EXTRACTION_WORKERS,
+                          output_path=None, journal_path=None, cancel_token=None, pdf_output_paths=None,
+                          metrics=None, dedup_threshold=DEDUP_THRESHOLD, pack_tokens=PACK_TOKEN_BUDGET,
+                          content_defined_chunks=CONTENT_DEFINED_CHUNKS, collect_cards=True, pdf_backend=PDF_BACKEND):
+    """Extract, chunk and generate cards for ``pdf_paths``; cards come back in PDF and chunk order.
+
+    Runs ``iter_flashcards`` and writes its stream, deduplicated, to the
+    output files. Returns the whole deck as one string, or None without
+    ``collect_cards`` (memory then stays flat however many PDFs there are).
+
+    - ``progress_callback(pdf_path, current_index, total, stage)``: stages
+      ``'chunking'``, ``'chunking_complete'`` and ``'generating'``; returning
+      False cancels. One that accepts ``metrics`` also gets ``metrics.snapshot()``.
+    - ``output_path``: the deck file; ``pdf_output_paths``: one file per PDF.
+    - ``journal_path``: lets an interrupted run resume; deleted once it completes.
+    - ``cancel_token``: stops the run; the cards finished so far are returned.
+    - ``metrics``: a ``RunMetrics``, created if not given.
+    - ``dedup_threshold``: see ``dedup``; None keeps duplicate cards.
+    - ``pack_tokens``: text budget for sending small chunks together; None sends each alone.
+    - ``content_defined_chunks``: cut with ``chunk_text_content_defined`` (ignored with ``chunk_tokens``).
+    - ``pdf_backend``: the text extractor (see ``pdf_backends``).
+    """
+    if cancel_token is None:
+        cancel_token = CancellationToken()
+    if metrics is None:
+        metrics = RunMetrics()
+
+    # Duplikati se izbacuju iz špila i izlaznih fajlova, a dnevnik čuva kartice onakve kakve je model vratio
+    def new_deduplicator():
+        return CardDeduplicator(dedup_threshold) if dedup_threshold is not None else None
+
+    deduplicator = new_deduplicator()
+    writer = CardWriter(output_path) if output_path else None
+    pdf_writer = None
+    pdf_writer_index = None
+    opened_pdf_outputs = set()
+    all_cards = [] if collect_cards else None
+    stream = iter_flashcards(pdf_paths, progress_callback, max_concurrent_requests=max_concurrent_requests,
+                             chunk_tokens=chunk_tokens, extraction_workers=extraction_workers,
+                             journal_path=journal_path, cancel_token=cancel_token, metrics=metrics,
+                             pack_tokens=pack_tokens, content_defined_chunks=content_defined_chunks,
+                             pdf_backend=pdf_backend)
+    try:
+        for pdf_index, chunk_index, cards in stream:
+            if pdf_output_paths and pdf_index != pdf_writer_index:
+                # Svaki PDF ima svoj špil, pa se duplikati traže samo unutar njega
+                if pdf_writer is not None:
+                    pdf_writer.close()
+                pdf_writer = CardWriter(pdf_output_paths[pdf_index], deduplicator=new_deduplicator())
+                pdf_writer_index = pdf_index
+                opened_pdf_outputs.add(pdf_index)
+            if pdf_writer is not None:
+                pdf_writer.write(cards)
+            if deduplicator is not None:
+                with metrics.stage('deduplication'):
+                    cards = deduplicator.filter(cards)
+            metrics.increment('deck_cards', len(cards))
+            if writer is not None:
+                writer.write(cards)
+            if all_cards is not None:
+                all_cards.extend(cards)
+    finally:
+        stream.close()
+        if writer is not None:
+            writer.close()
+        if pdf_writer is not None:
+            pdf_writer.close()
+
+    if pdf_output_paths and not cancel_token.is_cancelled():
+        # PDF-ovi bez ijednog dela i dalje dobijaju (prazan) fajl
+        for pdf_index, path in enumerate(pdf_output_paths):
+            if pdf_index not in opened_pdf_outputs:
+                CardWriter(path).close()
+    if deduplicator is not None:
+        metrics.increment('duplicates_removed', deduplicator.removed)
+    return '\n'.join(all_cards) if all_cards is not None else None
+
+
+def batch_state_path_for(output_path):
+    return output_path + '.batch.json'
+
+
+def submit_batch_job(pdf_paths, state_path, chunk_tokens=CHUNK_TOKEN_BUDGET, output_path=None,
+                     pdf_output_paths=None, dedup_threshold=DEDUP_THRESHOLD, progress_callback=None,
+                     extraction_workers=EXTRACTION_WORKERS, content_defined_chunks=CONTENT_DEFINED_CHUNKS,
+                     pdf_backend=PDF_BACKEND, cancel_token=None):
+    """Chunk ``pdf_paths`` and submit every uncached chunk as one JSONL batch job.
+
+    Batch inference trades latency for price and throughput, so this is
+    meant for overnight runs. Nothing is waited for: the job is described
+    in a ``BatchJobState`` at ``state_path`` and ``collect_batch_job`` picks
+    it up later, from this or any other process. Returns the state; if
+    every chunk is already cached no job is created and the state can be
+    collected right away. If ``cancel_token`` is cancelled before the
+    upload, nothing is submitted or saved and None is returned.
+    """
+    if extraction_workers > 1 and len(pdf_paths) > 1:
+        extraction_executor = ProcessPoolExecutor(max_workers=min(extraction_workers, len(pdf_paths)))
+    else:
+        extraction_executor = ThreadPoolExecutor(max_workers=1)
+    content_defined = content_defined_chunks and not chunk_tokens
+    chunks = []
+    with extraction_executor:
+        results = extraction_executor.map(extract_and_chunk, pdf_paths, [chunk_tokens] * len(pdf_paths),
+                                          [EXTRACTION_CACHE_FILE] * len(pdf_paths), [None] * len(pdf_paths),
+                                          [content_defined] * len(pdf_paths), [pdf_backend] * len(pdf_paths))
+        for pdf_index, (pdf_chunks, _) in enumerate(results):
+            chunks.append(pdf_chunks)
             if progress_callback:
-                progress_callback(pdf_path, processed_chunks, total_chunks, 'generating')
+                progress_callback(pdf_paths[pdf_index], pdf_index, len(pdf_paths), 'chunking')
+            if cancel_token is not None and cancel_token.is_cancelled():
+                # PDF-ovi koji se još nisu počeli čitati se ni ne čitaju
+                extraction_executor.shutdown(cancel_futures=True)
+                return None
 
-            # Calculate min and max cards for this chunk
-            chunk_min_cards = max(1, pdf_min_cards // chunk_count)
-            chunk_max_cards = max(chunk_min_cards, pdf_max_cards // chunk_count)
+    card_ranges = [chunk_card_ranges(pdf_chunks, content_defined) for pdf_chunks in chunks]
+    state = BatchJobState(state_path, model=model, prompt_version=PROMPT_VERSION, pdf_paths=list(pdf_paths),
+                          chunks=chunks, card_ranges=card_ranges, output_path=output_path,
+                          pdf_output_paths=pdf_output_paths, dedup_threshold=dedup_threshold)
+    lines = []
+    cache = load_cache()
+    try:
+        for pdf_index, pdf_chunks in enumerate(chunks):
+            for chunk_index, chunk in enumerate(pdf_chunks):
+                chunk_min_cards, chunk_max_cards = card_ranges[pdf_index][chunk_index]
+                if cache.get(flashcard_cache_key(chunk, chunk_min_cards, chunk_max_cards)) is not None:
+                    continue
+                custom_id = batch_custom_id(pdf_index, chunk_index)
+                state.requests.append({'custom_id': custom_id, 'pdf_index': pdf_index, 'chunk_index': chunk_index})
+                lines.append(batch_request_line(custom_id, chat_messages(USER_PROMPT_TEMPLATE.format(
+                    min_cards=chunk_min_cards, max_cards=chunk_max_cards, text=chunk))))
+    finally:
+        cache.close()
+
+    if lines:
+        try:
+            uploaded = get_client().files.upload(
+                file={'file_name': 'flashcards_batch.jsonl', 'content': ('\n'.join(lines) + '\n').encode('utf-8')},
+                purpose='batch')
+            job = get_client().batch.jobs.create(input_files=[uploaded.id], model=model, endpoint='/v1/chat/completions',
+                                           metadata={'source': 'met_card_generator'})
+        except Exception as e:
+            error_message = str(e).lower()
+            if "unauthorized" in error_message or "authentication" in error_message:
+                raise UnauthorizedError("API key is invalid or unauthorized")
+            raise FlashcardGenerationError(f"Failed to submit the batch job: {str(e)}")
+        state.input_file_id = uploaded.id
+        state.job_id = job.id
+        state.status = job.status
+    state.save()
+    return state
+
+
+def collect_batch_job(state_path, wait=False, poll_interval=BATCH_POLL_INTERVAL, progress_callback=None,
+                      cancel_token=None, metrics=None):
+    """Poll the batch job saved at ``state_path`` and, once it has finished, build the deck.
 
-            # Adjust for last chunk to ensure we meet the minimum
-            if chunk_index == chunk_count - 1:
-                chunk_min_cards = max(chunk_min_cards, pdf_min_cards - (chunk_count - 1) * chunk_min_cards)
-                chunk_max_cards = max(chunk_max_cards, pdf_max_cards - (chunk_count - 1) * chunk_max_cards)
+    Returns None while the job is still running, or if ``cancel_token`` was
+    cancelled while waiting or collecting; the state file is kept and
+    results already merged stay in the cache. When it is done, every
+    result is stored in the API cache under its per-chunk key, chunks the
+    job failed on are generated with regular requests, and the cards are
+    written to the output file(s) in PDF and chunk order. The state file is
+    then deleted and the merged deck is returned.
+    """
+    if metrics is None:
+        metrics = RunMetrics()
+    state = BatchJobState.load(state_path)
+    while not state.finished:
+        try:
+            job = get_client().batch.jobs.get(job_id=state.job_id)
+        except Exception as e:
+            error_message = str(e).lower()
+            if "unauthorized" in error_message or "authentication" in error_message:
+                raise UnauthorizedError("API key is invalid or unauthorized")
+            raise FlashcardGenerationError(f"Failed to check the batch job: {str(e)}")
+        state.status = job.status
+        state.completed_requests = job.completed_requests
+        state.output_file_id = job.output_file
+        state.save()
+        if progress_callback:
+            progress_callback(None, job.completed_requests - 1, job.total_requests, 'batch')
+        if state.finished:
+            break
+        if not wait:
+            return None
+        if cancel_token is not None:
+            if cancel_token.wait(poll_interval):
+                return None
+        else:
+            time.sleep(poll_interval)
 
-            flashcards = create_flashcards_with_rate_limit(chunk, cache, chunk_min_cards, chunk_max_cards)
-            if flashcards:
-                all_flashcards.extend(flashcards.split('\n'))
+    results = {}
+    if state.output_file_id:
+        response = get_client().files.download(file_id=state.output_file_id)
+        results = parse_batch_output(response.read())
+    metrics.increment('batch_results', len(results))
 
-            processed_chunks += 1
+    # Stanja sačuvana pre nego što su opsezi kartica upisivani imaju samo podrazumevane delove
+    card_ranges = state.card_ranges or [chunk_card_ranges(pdf_chunks) for pdf_chunks in state.chunks]
+    cache = load_cache()
+    all_cards = []
+    try:
+        for request in state.requests:
+            flashcards = results.get(request['custom_id'])
+            if flashcards is not None:
+                chunk = state.chunks[request['pdf_index']][request['chunk_index']]
+                chunk_min_cards, chunk_max_cards = card_ranges[request['pdf_index']][request['chunk_index']]
+                # Dopuna ide običnim zahtevom, jer je mala i ne vredi čekati novi batch posao
+                flashcards = top_up_flashcards(chunk, flashcards, chunk_min_cards, chunk_max_cards, cancel_token,
+                                               metrics)
+                cache.put(flashcard_cache_key(chunk, chunk_min_cards, chunk_max_cards), flashcards)
+            else:
+                metrics.increment('batch_fallbacks')
 
-    return post_process_flashcards('\n'.join(all_flashcards))
+        total_chunks = sum(len(pdf_chunks) for pdf_chunks in state.chunks)
+        processed_chunks = 0
+        for pdf_index, pdf_chunks in enumerate(state.chunks):
+            pdf_cards = []
+            for chunk_index, chunk in enumerate(pdf_chunks):
+                chunk_min_cards, chunk_max_cards = card_ranges[pdf_index][chunk_index]
+                # Sve je već u kešu, osim delova na kojima je batch posao pao i delova izbačenih iz keša
+                flashcards = create_flashcards_with_rate_limit(chunk, cache, chunk_min_cards, chunk_max_cards,
+                                                               cancel_token, metrics)
+                if flashcards:
+                    pdf_cards.extend(iter_processed_cards(flashcards))
+                processed_chunks += 1
+                if progress_callback:
+                    progress_callback(state.pdf_paths[pdf_index], processed_chunks - 1, total_chunks, 'generating')
+            if state.pdf_output_paths:
+                if state.dedup_threshold is not None:
+                    pdf_cards_out = deduplicate_cards(pdf_cards, state.dedup_threshold)
+                else:
+                    pdf_cards_out = pdf_cards
+                save_to_file(pdf_cards_out, state.pdf_output_paths[pdf_index])
+            all_cards.extend(pdf_cards)
+    except GenerationCancelled:
+        # Dopune i zamenski zahtevi poštuju Stop/Ctrl+C; sledeće preuzimanje nastavlja iz keša
+        return None
+    finally:
+        cache.close()
+
+    if state.dedup_threshold is not None:
+        deduplicated = deduplicate_cards(all_cards, state.dedup_threshold)
+        metrics.increment('duplicates_removed', len(all_cards) - len(deduplicated))
+        all_cards = deduplicated
+    metrics.increment('cards', len(all_cards))
+    if state.output_path:
+        save_to_file(all_cards, state.output_path)
+    metrics.finish()
+    state.remove()
+    return '\n'.join(all_cards)
 
 
 def save_to_file(flashcards, output_path, encoding='utf-8'):
@@ -225,31 +1484,335 @@ def save_to_file(flashcards, output_path, encoding='utf-8'):
         print(f"Error saving file: {e}")
         raise
 
-def post_process_flashcards(flashcards):
-    lines = flashcards.split('\n')
-    processed_cards = []
-    for line in lines:
+def iter_processed_cards(flashcards):
+    """Yield the cleaned-up ``question|answer`` cards of one response."""
+    for line in flashcards.split('\n'):
         if '|' in line:
             question, answer = line.split('|', 1)
             # Remove leading numbers, dots, and whitespace
             question = re.sub(r'^\s*\d+\.\s*', '', question.strip())
             if question and not question.lower().startswith('pitanje?'):
-                processed_cards.append(f"{question}|{answer}")
-    return '\n'.join(processed_cards)
+                yield f"{question}|{answer}"
+
+
+def post_process_flashcards(flashcards):
+    return '\n'.join(iter_processed_cards(flashcards))
 
 def clear_cache():
-    global cache
-    cache = {}
-    save_cache(cache)
+    cache = load_cache()
+    cache.clear()
+    cache.close()
     print("Cache cleared.")
 
-#
-# if __name__ == "__main__":
-#     pdf_path = f'{ROOT_DIRECTORY}/SOURCE_DOCUMENTS/CS120-L04.pdf'
-#     # Add an option to clear the cache before processing
-#     clear_cache_input = input("Da li želite da obrišete keš pre obrade? (da/ne): ").lower()
-#     if clear_cache_input == 'da':
-#         clear_cache()
-#
-#     flashcards = process_pdf(pdf_path)
-#     save_to_file(flashcards)
\ No newline at end of file
+
+def pdf_flashcard_cache_keys(pdf_paths, chunk_tokens=CHUNK_TOKEN_BUDGET, content_defined_chunks=CONTENT_DEFINED_CHUNKS,
+                             pdf_backend=PDF_BACKEND):
+    """Cache keys of every chunk of ``pdf_paths`` as the current settings would chunk and prompt them."""
+    content_defined = content_defined_chunks and not chunk_tokens
+    keys = set()
+    for pdf_path in pdf_paths:
+        chunks, _ = extract_and_chunk(pdf_path, chunk_tokens, EXTRACTION_CACHE_FILE, CancellationToken(),
+                                      content_defined, pdf_backend)
+        for chunk, (min_cards, max_cards) in zip(chunks, chunk_card_ranges(chunks, content_defined)):
+            keys.add(flashcard_cache_key(chunk, min_cards, max_cards))
+    return keys
+
+
+def export_cache_bundle(bundle_path, pdf_paths=None, chunk_tokens=CHUNK_TOKEN_BUDGET,
+                        content_defined_chunks=CONTENT_DEFINED_CHUNKS, pdf_backend=PDF_BACKEND):
+    """Export cached cards to a portable bundle (see ``cache_bundle``); returns ``(exported, missing)``.
+
+    With ``pdf_paths`` only the chunks of those PDFs are exported (they are
+    read and chunked with the given settings) and ``missing`` counts their
+    chunks that are not cached yet; otherwise the whole cache is exported.
+    """
+    keys = None
+    metadata = {'model': model, 'prompt_version': PROMPT_VERSION, 'pdfs': None}
+    if pdf_paths:
+        keys = pdf_flashcard_cache_keys(pdf_paths, chunk_tokens, content_defined_chunks, pdf_backend)
+        metadata['pdfs'] = [{'name': os.path.basename(pdf_path), 'sha256': file_sha256(pdf_path)}
+                            for pdf_path in pdf_paths]
+    cache = load_cache()
+    try:
+        exported = export_bundle(cache, bundle_path, keys, metadata)
+    finally:
+        cache.close()
+    return exported, len(keys) - exported if keys is not None else 0
+
+
+def import_cache_bundle(bundle_path, conflict='keep'):
+    """Merge a bundle into the API cache; returns ``(header, counts)`` as ``cache_bundle.import_bundle``."""
+    cache = load_cache()
+    try:
+        return import_bundle(cache, bundle_path, conflict)
+    finally:
+        cache.close()
+
+class ProgressReporter:
+    """Progress callback for the command line: human-readable lines or JSON lines on stderr.
+
+    'generating' events are throttled to one per ``interval`` seconds; stage
+    changes and the last chunk are always reported.
+    """
+
+    def __init__(self, mode='text', interval=1.0, stream=None):
+        self.mode = mode
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self._last_report = 0.0
+
+    def __call__(self, pdf_path, current_index, total, stage, metrics=None):
+        if self.mode == 'none':
+            return
+        now = time.monotonic()
+        if stage == 'generating' and current_index + 1 < total and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        current = total if stage == 'chunking_complete' else current_index + 1
+        event = {'event': 'progress', 'stage': stage, 'pdf': pdf_path, 'current': current, 'total': total}
+        if metrics is not None:
+            event.update(eta_seconds=metrics['eta_seconds'], chunks_per_minute=metrics['chunks_per_minute'],
+                         cache_hit_rate=metrics['cache_hit_rate'])
+        self.emit(event)
+
+    def emit(self, event):
+        if self.mode == 'none':
+            return
+        if self.mode == 'json':
+            event = dict(event, time=round(time.time(), 3))
+            self.stream.write(json.dumps(event, ensure_ascii=False) + '\n')
+        elif event['event'] == 'progress':
+            pdf_name = os.path.basename(event['pdf']) if event['pdf'] else ''
+            eta = f" ETA {event['eta_seconds']:.0f}s" if event.get('eta_seconds') is not None else ""
+            self.stream.write(f"[{event['stage']}] {event['current']}/{event['total']} {pdf_name}{eta}\n")
+        else:
+            self.stream.write(' '.join(f"{key}={value}" for key, value in event.items()) + '\n')
+        self.stream.flush()
+
+
+def expand_pdf_inputs(inputs):
+    """Turn files, directories (searched recursively) and glob patterns into a sorted, de-duplicated PDF list."""
+    pdf_paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = sorted(path for path in glob.glob(os.path.join(item, '**', '*'), recursive=True)
+                             if path.lower().endswith('.pdf') and os.path.isfile(path))
+        elif glob.has_magic(item):
+            matches = sorted(path for path in glob.glob(item, recursive=True) if path.lower().endswith('.pdf'))
+        else:
+            matches = [item]
+        pdf_paths.extend(matches)
+
+    seen = set()
+    unique_paths = []
+    for pdf_path in pdf_paths:
+        key = os.path.abspath(pdf_path)
+        if key not in seen:
+            seen.add(key)
+            unique_paths.append(pdf_path)
+    return unique_paths
+
+
+def default_output_path(pdf_path, output_dir=None):
+    # Isto ime kao podrazumevani izlaz u GUI-ju: <ime PDF-a>_flashcards.txt
+    output_name = os.path.splitext(os.path.basename(pdf_path))[0] + "_flashcards.txt"
+    return os.path.join(output_dir or os.path.dirname(pdf_path), output_name)
+
+
+def main(argv=None):
+    global CACHE_FILE, EXTRACTION_CACHE_FILE
+
+    parser = argparse.ArgumentParser(
+        description="Generate Anki flashcards from MET lecture PDFs without the GUI.")
+    parser.add_argument('inputs', nargs='*', help="PDF files, directories or glob patterns")
+    output_group = parser.add_mutually_exclusive_group()
+    output_group.add_argument('-o', '--output', help="write one merged deck to this file")
+    output_group.add_argument('--output-dir', help="write <name>_flashcards.txt per PDF into this directory "
+                                                  "(default: next to each PDF)")
+    parser.add_argument('--journal', help="journal used to resume an interrupted run "
+                                          "(default: <output>.journal or flashcards_batch.journal)")
+    parser.add_argument('--no-resume', action='store_true', help="ignore an existing journal and start over")
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENT_REQUESTS,
+                        help="maximum number of API requests in flight")
+    parser.add_argument('--extraction-workers', type=int, default=EXTRACTION_WORKERS,
+                        help="number of processes reading PDFs")
+    parser.add_argument('--request-timeout', type=float, default=REQUEST_READ_TIMEOUT,
+                        help="seconds to wait for an API response before retrying")
+    parser.add_argument('--requests-per-minute', type=float, default=None,
+                        help="limit on API request starts, shared with other runs on the same API key (0 removes it)")
+    parser.add_argument('--tokens-per-minute', type=float, default=None,
+                        help="limit on prompt plus completion tokens per minute, shared like --requests-per-minute")
+    parser.add_argument('--hedge', nargs='?', type=float, const=HEDGE_MAX_EXTRA_FRACTION, default=None,
+                        metavar='BUDGET',
+                        help="send a duplicate of requests slower than the recent p95 latency; the first answer wins. "
+                             f"BUDGET caps duplicates as a fraction of all requests (default {HEDGE_MAX_EXTRA_FRACTION})")
+    parser.add_argument('--chunk-tokens', type=int, default=CHUNK_TOKEN_BUDGET,
+                        help="size chunks by this total prompt token budget instead of characters")
+    parser.add_argument('--pdf-backend', choices=sorted(PDF_BACKENDS), default=PDF_BACKEND,
+                        help="PDF text extractor; pypdfium2 is many times faster than pdfplumber")
+    parser.add_argument('--content-defined-chunks', action='store_true',
+                        help="choose chunk boundaries by content, so editing a PDF only regenerates the chunks "
+                             "around the edit")
+    parser.add_argument('--pack-tokens', type=int, default=PACK_TOKEN_BUDGET,
+                        help="pack small chunks (across PDFs) into shared requests of up to this many text tokens")
+    parser.add_argument('--cache-dir', help="directory holding api_cache.db and extraction_cache.db")
+    parser.add_argument('--clear-cache', action='store_true', help="clear the API cache before processing")
+    parser.add_argument('--import-cache', action='append', metavar='BUNDLE',
+                        help="merge a cache bundle from another machine before processing (may be repeated); "
+                             "without inputs only imports")
+    parser.add_argument('--cache-conflict', choices=MERGE_CONFLICT_RULES, default='keep',
+                        help="when an imported entry differs from the local one: keep the local cards, replace "
+                             "them, or keep the newer")
+    parser.add_argument('--export-cache', metavar='BUNDLE',
+                        help="write the cached cards of the given PDFs (or of the whole cache, without inputs) "
+                             "to a compressed bundle instead of processing")
+    dedup_group = parser.add_mutually_exclusive_group()
+    dedup_group.add_argument('--dedup-threshold', type=float, default=DEDUP_THRESHOLD,
+                             help="question similarity (0-1) above which a card counts as a duplicate; "
+                                  "1 removes only repeated questions")
+    dedup_group.add_argument('--no-dedup', action='store_true', help="keep duplicate cards")
+    parser.add_argument('--progress', choices=['text', 'json', 'none'], default='text',
+                        help="progress output on stderr")
+    parser.add_argument('--progress-interval', type=float, default=1.0,
+                        help="minimum seconds between progress lines while generating")
+    parser.add_argument('--batch', action='store_true',
+                        help="submit the uncached chunks as one batch job (cheaper, slower) and exit; "
+                             "run the same command again to collect the results")
+    parser.add_argument('--batch-state', help="batch job state file (default: <output>.batch.json or "
+                                              "flashcards_batch.batch.json)")
+    parser.add_argument('--wait', action='store_true', help="with --batch, poll until the job has finished")
+    parser.add_argument('--poll-interval', type=float, default=BATCH_POLL_INTERVAL,
+                        help="seconds between batch job status checks")
+    parser.add_argument('--metrics-file', help="write run metrics here at the end (.prom for Prometheus text, "
+                                               "anything else for JSON)")
+    args = parser.parse_args(argv)
+
+    pdf_paths = expand_pdf_inputs(args.inputs)
+    missing = [pdf_path for pdf_path in pdf_paths if not os.path.isfile(pdf_path)]
+    if missing:
+        parser.error(f"file not found: {missing[0]}")
+    if not pdf_paths and (args.inputs or not (args.import_cache or args.export_cache)):
+        parser.error("no PDF files matched the given inputs")
+    if not 0 < args.dedup_threshold <= 1:
+        parser.error("--dedup-threshold must be between 0 and 1")
+
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+        CACHE_FILE = os.path.join(args.cache_dir, 'api_cache.db')
+        EXTRACTION_CACHE_FILE = os.path.join(args.cache_dir, 'extraction_cache.db')
+    set_rate_limit(args.requests_per_minute, args.tokens_per_minute)
+    set_hedging(args.hedge)
+    client_manager.read_timeout = args.request_timeout
+    if args.clear_cache:
+        clear_cache()
+    for bundle_path in args.import_cache or ():
+        try:
+            header, counts = import_cache_bundle(bundle_path, args.cache_conflict)
+        except (OSError, EOFError, ValueError) as e:
+            print(f"Error: could not import {bundle_path}: {e}", file=sys.stderr)
+            return 1
+        print(f"Imported {bundle_path}: {counts['added']} new, {counts['replaced']} replaced, "
+              f"{counts['kept']} conflicts kept, {counts['unchanged']} already cached.")
+        if (header.get('model'), header.get('prompt_version')) != (model, PROMPT_VERSION):
+            # Ključevi sadrže model i verziju prompta, pa se ovi unosi neće koristiti dok se oni ne poklope
+            print(f"Warning: {bundle_path} was made with {header.get('model')} (prompt version "
+                  f"{header.get('prompt_version')}); this run uses {model} (prompt version {PROMPT_VERSION}).",
+                  file=sys.stderr)
+    if args.export_cache:
+        exported, missing = export_cache_bundle(args.export_cache, pdf_paths, args.chunk_tokens,
+                                                args.content_defined_chunks, args.pdf_backend)
+        print(f"Exported {exported} cached chunks to {args.export_cache}"
+              + (f" ({missing} chunks of these PDFs are not cached yet)." if missing else "."))
+        return 0
+    if not pdf_paths:
+        return 0
+
+    pdf_output_paths = None
+    if args.output:
+        journal_path = args.journal or journal_path_for(args.output)
+    else:
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        pdf_output_paths = [default_output_path(pdf_path, args.output_dir) for pdf_path in pdf_paths]
+        journal_path = args.journal or os.path.join(args.output_dir or os.getcwd(), 'flashcards_batch.journal')
+    if args.output:
+        batch_state_path = args.batch_state or batch_state_path_for(args.output)
+    else:
+        batch_state_path = args.batch_state or os.path.join(args.output_dir or os.getcwd(),
+                                                            'flashcards_batch.batch.json')
+    if args.no_resume:
+        for path in (journal_path, batch_state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    reporter = ProgressReporter(args.progress, args.progress_interval)
+    cancel_token = CancellationToken()
+
+    def handle_interrupt(signum, frame):
+        # Prvi Ctrl+C zaustavlja posao i čuva završene kartice, drugi prekida odmah
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        cancel_token.cancel()
+
+    signal.signal(signal.SIGINT, handle_interrupt)
+    start_time = time.time()
+    metrics = RunMetrics()
+    dedup_threshold = None if args.no_dedup else args.dedup_threshold
+    try:
+        if args.batch:
+            # Stanje posla je na disku, pa ga proverava (i preuzima rezultate) bilo koje kasnije pokretanje
+            if not os.path.exists(batch_state_path):
+                state = submit_batch_job(pdf_paths, batch_state_path, chunk_tokens=args.chunk_tokens,
+                                         output_path=args.output, pdf_output_paths=pdf_output_paths,
+                                         dedup_threshold=dedup_threshold, progress_callback=reporter,
+                                         extraction_workers=args.extraction_workers,
+                                         content_defined_chunks=args.content_defined_chunks,
+                                         pdf_backend=args.pdf_backend, cancel_token=cancel_token)
+                if state is None:
+                    reporter.emit({'event': 'cancelled', 'state': batch_state_path})
+                    return 130
+                reporter.emit({'event': 'batch_submitted', 'job_id': state.job_id, 'requests': len(state.requests),
+                               'state': batch_state_path})
+            flashcards = collect_batch_job(batch_state_path, wait=args.wait, poll_interval=args.poll_interval,
+                                           progress_callback=reporter, cancel_token=cancel_token, metrics=metrics)
+            if flashcards is None:
+                if cancel_token.is_cancelled():
+                    reporter.emit({'event': 'cancelled', 'state': batch_state_path})
+                    return 130
+                reporter.emit({'event': 'batch_pending', 'state': batch_state_path})
+                return 3
+            total_cards = len(flashcards.split('\n')) if flashcards else 0
+        else:
+            process_multiple_pdfs(pdf_paths, reporter, max_concurrent_requests=args.concurrency,
+                                  chunk_tokens=args.chunk_tokens, extraction_workers=args.extraction_workers,
+                                  output_path=args.output, journal_path=journal_path, cancel_token=cancel_token,
+                                  pdf_output_paths=pdf_output_paths, metrics=metrics,
+                                  dedup_threshold=dedup_threshold, pack_tokens=args.pack_tokens,
+                                  content_defined_chunks=args.content_defined_chunks, collect_cards=False,
+                                  pdf_backend=args.pdf_backend)
+            total_cards = metrics.counters.get('deck_cards', 0)
+    except UnauthorizedError as e:
+        reporter.emit({'event': 'error', 'kind': 'unauthorized', 'message': str(e)})
+        return 2
+    except FlashcardGenerationError as e:
+        reporter.emit({'event': 'error', 'kind': 'generation', 'message': str(e)})
+        return 1
+    finally:
+        if args.metrics_file:
+            metrics.export(args.metrics_file)
+
+    summary = {'event': 'cancelled' if cancel_token.is_cancelled() else 'done', 'pdfs': len(pdf_paths),
+               'cards': total_cards, 'duplicates_removed': metrics.counters.get('duplicates_removed', 0),
+               'seconds': round(time.time() - start_time, 1)}
+    if args.hedge:
+        saved = metrics.histograms.get('hedge_latency_saved')
+        summary.update(hedges_fired=metrics.counters.get('hedges_fired', 0),
+                       hedges_won=metrics.counters.get('hedges_won', 0),
+                       hedge_seconds_saved=round(saved.total, 1) if saved else 0.0)
+    if metrics.counters.get('throttled'):
+        summary['throttled'] = metrics.counters['throttled']
+    reporter.emit(summary)
+    return 130 if cancel_token.is_cancelled() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import json
+import os
+import time
+
+# Stanja batch posla posle kojih se više ništa ne menja
+BATCH_FINAL_STATUSES = ('SUCCESS', 'FAILED', 'TIMEOUT_EXCEEDED', 'CANCELLED')
+
+
+def batch_custom_id(pdf_index, chunk_index):
+    return f"{pdf_index}-{chunk_index}"
+
+
+def batch_request_line(custom_id, messages):
+    return json.dumps({'custom_id': custom_id, 'body': {'messages': messages}}, ensure_ascii=False)
+
+
+def parse_batch_output(data):
+    """Map ``custom_id`` to the generated text for every successful line of a batch output file."""
+    results = {}
+    for line in data.decode('utf-8').splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            response = record.get('response') or {}
+            if response.get('status_code', 200) != 200 or record.get('error'):
+                continue
+            results[record['custom_id']] = response['body']['choices'][0]['message']['content']
+        except (ValueError, KeyError, IndexError, TypeError):
+            # Neispravan red se tretira kao neuspeo zahtev i kasnije šalje pojedinačno
+            continue
+    return results
+
+
+class BatchJobState:
+    """JSON file describing a submitted batch job, so its results can be collected by a later process.
+
+    It holds the job and file ids, the chunk lists of every PDF with the
+    card range of every chunk, which chunks were sent and where the
+    finished deck goes. It is rewritten atomically after every status poll
+    and deleted once the results have been merged.
+    """
+
+    def __init__(self, path, **fields):
+        self.path = path
+        self.job_id = fields.get('job_id')
+        self.input_file_id = fields.get('input_file_id')
+        self.output_file_id = fields.get('output_file_id')
+        self.status = fields.get('status')
+        self.model = fields.get('model')
+        self.prompt_version = fields.get('prompt_version')
+        self.submitted_at = fields.get('submitted_at', time.time())
+        self.pdf_paths = fields.get('pdf_paths', [])
+        self.chunks = fields.get('chunks', [])
+        self.card_ranges = fields.get('card_ranges')
+        self.requests = fields.get('requests', [])
+        self.output_path = fields.get('output_path')
+        self.pdf_output_paths = fields.get('pdf_output_paths')
+        self.dedup_threshold = fields.get('dedup_threshold')
+        self.completed_requests = fields.get('completed_requests', 0)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(path, **json.load(f))
+
+    @property
+    def finished(self):
+        return self.job_id is None or self.status in BATCH_FINAL_STATUSES
+
+    def save(self):
+        fields = {key: value for key, value in vars(self).items() if key != 'path'}
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(fields, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        os.remove(self.path)
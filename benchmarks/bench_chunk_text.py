@@ -0,0 +1,91 @@
+"""Compare chunk_text against the original backwards-scanning implementation.
+
+Usage: python benchmarks/bench_chunk_text.py [--size-mb 4] [--target-size 4000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from anki_flash import chunk_text  # noqa: E402
+from corpus import synthetic_text  # noqa: E402
+
+
+def legacy_chunk_text(text, target_size, tolerance=0.1):
+    # Originalna implementacija, zadržana kao referenca za granice i vreme izvršavanja
+    min_size = int(target_size * (1 - tolerance))
+    max_size = int(target_size * (1 + tolerance))
+    result = []
+    current_index = 0
+
+    def find_break(start, end):
+        break_chars = [('\n\n', 4), ('\n', 3), ('.', 2), ('!', 2), ('?', 2), (',', 1), (' ', 0)]
+
+        for char, priority in break_chars:
+            for i in range(end, start - 1, -1):
+                if text[i:i + len(char)] == char:
+                    if priority == 2 and i + 1 < len(text) and not text[i + 1].isspace():
+                        continue
+                    return i + len(char), priority
+
+        return end, -1
+
+    while current_index < len(text):
+        if current_index + min_size >= len(text):
+            chunk = text[current_index:].strip()
+            if chunk:
+                result.append(chunk)
+            break
+
+        end_index = min(current_index + max_size, len(text))
+
+        break_point, priority = find_break(current_index + min_size, end_index)
+
+        if priority < 0 and break_point < len(text) and not text[break_point].isspace():
+            better_break, _ = find_break(current_index, break_point)
+            if better_break > current_index:
+                break_point = better_break
+
+        chunk = text[current_index:break_point].strip()
+        if chunk:
+            result.append(chunk)
+
+        current_index = break_point
+
+    return result
+
+
+def best_of(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=4)
+    parser.add_argument('--target-size', type=int, default=4000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    cases = (('paragraphs', False, True), ('line breaks only', False, False), ('unbroken runs', True, True))
+    for label, long_runs, paragraphs in cases:
+        text = synthetic_text(size, long_runs=long_runs, paragraphs=paragraphs)
+        legacy_time, legacy_chunks = best_of(lambda: legacy_chunk_text(text, args.target_size), args.repeat)
+        new_time, new_chunks = best_of(lambda: chunk_text(text, args.target_size), args.repeat)
+        if new_chunks != legacy_chunks:
+            raise SystemExit(f"{label}: chunk boundaries differ from the legacy implementation")
+        print(f"{label}: {len(text) / 1e6:.1f}M chars, {len(new_chunks)} chunks | "
+              f"legacy {legacy_time:.3f}s, indexed {new_time:.3f}s, speedup {legacy_time / new_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
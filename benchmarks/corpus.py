@@ -0,0 +1,98 @@
+"""Synthetic lecture corpus for the benchmarks: plain text and minimal PDFs."""
+import os
+import random
+
+WORDS = ("memorija registar procesor magistrala sekvencijalna kola flip-flop latch čip adresa podatak "
+         "instrukcija prekid keš takt signal vežba šema logička kapija brojač dekoder multiplekser").split()
+
+# Reči za PDF-ove moraju da stanu u WinAnsiEncoding standardnog Helvetica fonta (nema č, ć ni đ)
+PDF_WORDS = ("memorija registar procesor magistrala sekvencijalna kola flip-flop latch adresa podatak "
+             "instrukcija prekid takt signal šema logička kapija brojač dekoder multiplekser").replace('č', 'c').split()
+
+
+def synthetic_text(size, seed=0, long_runs=False, paragraphs=True):
+    """Lecture-like text: sentences, commas, line and paragraph breaks.
+
+    With ``long_runs`` some paragraphs are replaced by long unbroken tokens
+    (formulas, hex dumps) so the mid-word fallback path gets exercised too.
+    Without ``paragraphs`` there are only single line breaks, which is what
+    pdfplumber's extract_text usually produces.
+    """
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        if long_runs and rng.random() < 0.02:
+            piece = ''.join(rng.choice('0123456789ABCDEF') for _ in range(rng.randint(3000, 6000)))
+        else:
+            words = [rng.choice(WORDS) for _ in range(rng.randint(4, 18))]
+            if rng.random() < 0.3:
+                words[rng.randrange(len(words))] += ','
+            piece = ' '.join(words).capitalize() + rng.choice(['.', '.', '.', '?', '!', '.5'])
+        piece += rng.choice([' ', ' ', ' ', '\n', '\n\n' if paragraphs else ' '])
+        parts.append(piece)
+        length += len(piece)
+    return ''.join(parts)
+
+
+def _pdf_string(line):
+    data = line.encode('cp1252')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def write_pdf(path, pages):
+    """Write a minimal PDF with one Helvetica text line per entry of every page in ``pages``."""
+    objects = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>", None]
+    font_id, pages_id = 1, 2
+    kids = []
+    for lines in pages:
+        stream = b"BT /F1 10 Tf 12 TL 40 800 Td " + b" ".join(_pdf_string(line) + b" '" for line in lines) + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id))
+        kids.append(len(objects))
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+    catalog_id = len(objects)
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for object_id, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % object_id + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_offset)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def lecture_pages(page_count, seed=0, lines_per_page=60, exercise_page=None):
+    """Pages of a fake lecture: two cover pages, body text and optionally a 'Pokazne vežbe' page."""
+    rng = random.Random(seed)
+    pages = [["Metropolitan univerzitet"], ["Sadrzaj lekcije"]]
+    for page_index in range(2, page_count):
+        if page_index == exercise_page:
+            pages.append(["Pokazne vežbe", "Zadatak 1."])
+            continue
+        lines = []
+        for _ in range(lines_per_page):
+            words = [rng.choice(PDF_WORDS) for _ in range(rng.randint(6, 14))]
+            lines.append(' '.join(words).capitalize() + rng.choice(['.', ',', '.', ':', '?']))
+        pages.append(lines)
+    return pages
+
+
+def build_corpus(directory, page_counts=(8, 20, 40), seed=0):
+    """Write one lecture PDF per entry of ``page_counts`` into ``directory`` and return their paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index, page_count in enumerate(page_counts):
+        path = os.path.join(directory, f"lekcija_{index:02d}_{page_count}p.pdf")
+        exercise_page = page_count - 2 if page_count > 6 else None
+        write_pdf(path, lecture_pages(page_count, seed=seed + index, exercise_page=exercise_page))
+        paths.append(path)
+    return paths
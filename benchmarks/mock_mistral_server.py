@@ -0,0 +1,308 @@
+"""Local stand-in for the Mistral chat completions and batch endpoints.
+
+Usage: python benchmarks/mock_mistral_server.py [--port 8765] [--latency 0.5] [--error-rate 0.02] [--rate-limit-rate 0.05]
+                                                [--short-rate 0.1] [--tail-rate 0.03] [--requests-per-minute 60]
+                                                [--batch-delay 5]
+
+--short-rate answers that fraction of successful requests with only half
+of the requested cards, so top-up requests get exercised. --tail-rate makes
+that fraction of responses take --tail-latency seconds instead, for
+measuring tail latency and request hedging. --requests-per-minute answers
+requests over the limit with 429 and the Retry-After of a real server.
+
+Batch jobs (POST /v1/files, POST /v1/batch/jobs, GET /v1/batch/jobs/<id>,
+GET /v1/files/<id>/content) stay RUNNING for --batch-delay seconds and then
+succeed; --error-rate applies to their individual requests.
+
+Point the client at it with MISTRAL_SERVER_URL=http://127.0.0.1:8765 (any API key works).
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CARD_RANGE_PATTERN = re.compile(r'između (\d+) i (\d+) (?:NOVIH )?flash kartica')
+# Upakovani zahtevi: oznaka dela, broj kartica i tekst tog dela
+SECTION_PATTERN = re.compile(r'^\s*(### DEO \d+) \(između (\d+) i (\d+) kartica\)\s*\n\s*Tekst: (.*?)(?=^\s*### DEO |\Z)',
+                             re.MULTILINE | re.DOTALL)
+
+
+class MockMistralServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.5, latency_jitter=0.2, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1, seed=None, batch_delay=5.0, short_rate=0.0, tail_rate=0.0, tail_latency=5.0,
+                 requests_per_minute=None):
+        super().__init__(address, MockMistralHandler)
+        self.batch_delay = batch_delay
+        self.files = {}
+        self.jobs = {}
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.short_rate = short_rate
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.retry_after = retry_after
+        self.requests_per_minute = requests_per_minute
+        self.request_starts = deque()
+        self.rng = random.Random(seed)
+        self.stats = {'requests': 0, 'completions': 0, 'errors': 0, 'rate_limited': 0, 'short_responses': 0,
+                      'slow_responses': 0, 'batch_jobs': 0, 'batch_requests': 0}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def add_file(self, filename, content, purpose, sample_type='batch_request'):
+        file_id = uuid.uuid4().hex
+        with self.lock:
+            self.files[file_id] = content
+        return {'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+                'filename': filename, 'purpose': purpose, 'sample_type': sample_type, 'source': 'upload', 'num_lines': content.count(b'\n')}
+
+    def create_job(self, request):
+        job = {'id': uuid.uuid4().hex, 'object': 'batch', 'input_files': request['input_files'],
+               'endpoint': request['endpoint'], 'model': request.get('model'), 'metadata': request.get('metadata'),
+               'errors': [], 'status': 'RUNNING', 'created_at': int(time.time()), 'started_at': int(time.time()),
+               'completed_at': None, 'output_file': None, 'error_file': None, 'total_requests': 0,
+               'completed_requests': 0, 'succeeded_requests': 0, 'failed_requests': 0}
+        lines = [json.loads(line) for file_id in request['input_files']
+                 for line in self.files[file_id].decode('utf-8').splitlines() if line.strip()]
+        job['total_requests'] = len(lines)
+        with self.lock:
+            self.jobs[job['id']] = job
+        self.count('batch_jobs')
+        timer = threading.Timer(self.batch_delay, self.finish_job, args=(job, lines))
+        timer.daemon = True
+        timer.start()
+        return job
+
+    def finish_job(self, job, lines):
+        output = []
+        for line in lines:
+            self.count('batch_requests')
+            roll, _ = self.draw()
+            record = {'id': uuid.uuid4().hex, 'custom_id': line['custom_id'], 'error': None}
+            if roll < self.error_rate:
+                record['response'] = {'status_code': 500, 'body': {'message': 'Internal server error'}}
+                job['failed_requests'] += 1
+            else:
+                body = dict(line['body'], model=job['model'])
+                record['response'] = {'status_code': 200, 'body': completion_payload(body, self.is_short(roll))}
+                job['succeeded_requests'] += 1
+            job['completed_requests'] += 1
+            output.append(json.dumps(record, ensure_ascii=False))
+        output_file = self.add_file(f"{job['id']}.jsonl", ('\n'.join(output) + '\n').encode('utf-8'), 'batch',
+                                   'batch_result')
+        job.update(output_file=output_file['id'], status='SUCCESS', completed_at=int(time.time()))
+
+    def is_short(self, roll):
+        # Kratki odgovori su s drugog kraja intervala, da se ne preklapaju sa greškama
+        if roll >= 1.0 - self.short_rate:
+            self.count('short_responses')
+            return True
+        return False
+
+    def over_limit(self):
+        """Seconds until the next request fits ``requests_per_minute`` (sliding 60 s window), 0 if it fits now."""
+        if not self.requests_per_minute:
+            return 0
+        now = time.monotonic()
+        with self.lock:
+            while self.request_starts and self.request_starts[0] <= now - 60:
+                self.request_starts.popleft()
+            if len(self.request_starts) < self.requests_per_minute:
+                self.request_starts.append(now)
+                return 0
+            return self.request_starts[0] + 60 - now
+
+    def response_latency(self, jitter):
+        # Posebno izvlačenje, da spori odgovori ne zavise od grešaka i kratkih odgovora
+        with self.lock:
+            slow = self.rng.random() < self.tail_rate
+        if slow:
+            self.count('slow_responses')
+            return self.tail_latency
+        return max(0.0, self.latency + jitter)
+
+    def draw(self):
+        # Jedno izvlačenje po zahtevu, pod lock-om jer random.Random nije bezbedan za niti
+        with self.lock:
+            return self.rng.random(), self.rng.uniform(-self.latency_jitter, self.latency_jitter)
+
+
+class MockMistralHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def read_upload(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode('latin-1')
+        message = BytesParser(policy=HTTP).parsebytes(header + self.rfile.read(length))
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            fields[name] = (part.get_filename(), part.get_payload(decode=True))
+        return fields
+
+    def do_GET(self):
+        server = self.server
+        parts = self.path.rstrip('/').split('/')
+        if parts[1:4] == ['v1', 'batch', 'jobs'] and len(parts) == 5 and parts[4] in server.jobs:
+            self.send_json(200, server.jobs[parts[4]])
+        elif parts[1:3] == ['v1', 'files'] and len(parts) == 5 and parts[4] == 'content' and parts[3] in server.files:
+            body = server.files[parts[3]]
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_json(404, {'message': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        server = self.server
+        path = self.path.rstrip('/')
+        if path == '/v1/files':
+            fields = self.read_upload()
+            filename, content = fields['file']
+            purpose = fields.get('purpose', (None, b'batch'))[1].decode('utf-8')
+            self.send_json(200, server.add_file(filename, content, purpose))
+            return
+        if path == '/v1/batch/jobs':
+            self.send_json(200, server.create_job(self.read_json()))
+            return
+        if path != '/v1/chat/completions':
+            self.send_json(404, {'message': f'Unknown path {self.path}'})
+            return
+        server.count('requests')
+        request = self.read_json()
+        roll, jitter = server.draw()
+
+        wait = server.over_limit()
+        if roll < server.rate_limit_rate or wait:
+            server.count('rate_limited')
+            self.send_json(429, {'message': 'Requests rate limit exceeded'},
+                           headers={'Retry-After': str(math.ceil(wait) if wait else server.retry_after)})
+            return
+        time.sleep(server.response_latency(jitter))
+        if roll < server.rate_limit_rate + server.error_rate:
+            server.count('errors')
+            self.send_json(500, {'message': 'Internal server error'})
+            return
+
+        self.send_json(200, completion_payload(request, server.is_short(roll)))
+        server.count('completions')
+
+
+def make_cards(text, card_count):
+    # Pitanja se prave od reči iz teksta, da se ne bi međusobno izbacivala kao duplikati
+    words = re.findall(r'\w+', text) or ['tekst']
+    cards = []
+    for index in range(card_count):
+        phrase = ' '.join(words[(index * 6 + offset) % len(words)] for offset in range(8))
+        cards.append(f"Šta znači: {phrase}?|Odgovor {index + 1} za dati deo teksta.")
+    return cards
+
+
+def completion_payload(request, short=False):
+    prompt = request['messages'][-1]['content']
+    sections = SECTION_PATTERN.findall(prompt)
+    if sections:
+        lines = []
+        for marker, min_cards, _, text in sections:
+            lines.append(marker)
+            lines.extend(make_cards(text, int(min_cards) // 2 if short else int(min_cards)))
+        cards = '\n'.join(lines)
+    else:
+        match = CARD_RANGE_PATTERN.search(prompt)
+        card_count = int(match.group(1)) if match else 5
+        if short:
+            card_count //= 2
+        cards = '\n'.join(make_cards(prompt.rsplit('Tekst:', 1)[-1], card_count))
+    prompt_tokens = sum(len(message['content']) for message in request['messages']) // 4
+    completion_tokens = len(cards) // 4
+    return {
+        'id': uuid.uuid4().hex,
+        'object': 'chat.completion',
+        'model': request.get('model', 'mistral-small-latest'),
+        'created': int(time.time()),
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens},
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': cards}}],
+    }
+
+
+def start_mock_server(port=0, **options):
+    """Start the server on a background thread and return it; ``server.url`` is the base URL."""
+    server = MockMistralServer(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help="mean response time in seconds")
+    parser.add_argument('--latency-jitter', type=float, default=0.2)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="fraction answered with 429")
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--short-rate', type=float, default=0.0,
+                        help="fraction of responses with only half of the requested cards")
+    parser.add_argument('--tail-rate', type=float, default=0.0, help="fraction of responses that take --tail-latency")
+    parser.add_argument('--tail-latency', type=float, default=5.0)
+    parser.add_argument('--requests-per-minute', type=int, default=None,
+                        help="answer requests over this limit with 429 and a matching Retry-After")
+    parser.add_argument('--batch-delay', type=float, default=5.0, help="seconds until a batch job succeeds")
+    args = parser.parse_args()
+
+    server = MockMistralServer(('127.0.0.1', args.port), latency=args.latency, latency_jitter=args.latency_jitter,
+                               error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                               retry_after=args.retry_after, batch_delay=args.batch_delay,
+                               short_rate=args.short_rate, tail_rate=args.tail_rate, tail_latency=args.tail_latency,
+                               requests_per_minute=args.requests_per_minute)
+    print(f"Mock Mistral server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+"""Offline benchmark suite for the flashcard pipeline.
+
+Usage: python benchmarks/run_benchmarks.py [--quick] [--output results.json] [--compare previous.json]
+
+Builds a synthetic lecture corpus, starts a local mock of the Mistral chat
+endpoint and times startup (import and warm-up), PDF extraction (with every
+backend, and how closely its text matches pdfplumber's), chunking
+(and how many chunks a small edit invalidates), post-processing, card deduplication, the API cache and end-to-end
+process_multiple_pdfs throughput and peak memory. Results are written as JSON (by default
+to benchmarks/results/<timestamp>.json) so runs of different versions can
+be compared with --compare.
+"""
+import argparse
+import difflib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+import tracemalloc
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIRECTORY))
+
+from mistralai import Mistral  # noqa: E402
+
+import anki_flash  # noqa: E402
+from cache_store import make_cache_key, open_cache, open_extraction_cache  # noqa: E402
+from corpus import WORDS, build_corpus, synthetic_text  # noqa: E402
+from dedup import deduplicate_cards  # noqa: E402
+from mock_mistral_server import start_mock_server  # noqa: E402
+from pdf_backends import DEFAULT_PDF_BACKEND, PDF_BACKENDS  # noqa: E402
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+import anki_flash
+anki_flash.EXTRACTION_CACHE_FILE = sys.argv[1]
+anki_flash.warm_up()
+print(json.dumps({{'import_seconds': imported - start, 'warm_up_seconds': time.perf_counter() - imported,
+                  'modules': len(sys.modules)}}))
+'''
+
+
+def bench_startup(work_dir, repeats=3):
+    # Svako merenje u svežem interpreteru, jer drugi uvoz istog modula ne košta ništa
+    results = {}
+    for module in ('anki_flash', 'flashcardgui'):
+        runs = []
+        for _ in range(repeats):
+            completed = subprocess.run(
+                [sys.executable, '-c', STARTUP_SCRIPT.format(module=module),
+                 os.path.join(work_dir, 'startup_extraction_cache.db')],
+                cwd=os.path.dirname(BENCHMARK_DIRECTORY), capture_output=True, text=True)
+            if completed.returncode != 0:
+                break
+            runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        if not runs:
+            results[module] = {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr else 'failed'}
+            continue
+        results[module] = {'import_seconds': round(min(run['import_seconds'] for run in runs), 4),
+                           'warm_up_seconds': round(min(run['warm_up_seconds'] for run in runs), 4),
+                           'modules_loaded': runs[0]['modules']}
+    return results
+
+
+def bench_read_pdf(pdf_paths, work_dir):
+    page_count = 0
+    for pdf_path in pdf_paths:
+        page_count += int(pdf_path.rsplit('_', 1)[1].rstrip('p.pdf'))
+
+    cold, texts = timed(lambda: [anki_flash.read_pdf(pdf_path) for pdf_path in pdf_paths])
+    extraction_cache = open_extraction_cache(os.path.join(work_dir, 'bench_extraction.db'))
+    try:
+        fill, _ = timed(lambda: [anki_flash.read_pdf(pdf_path, extraction_cache) for pdf_path in pdf_paths])
+        warm, _ = timed(lambda: [anki_flash.read_pdf(pdf_path, extraction_cache) for pdf_path in pdf_paths])
+    finally:
+        extraction_cache.close()
+    return {
+        'pdfs': len(pdf_paths),
+        'pages': page_count,
+        'chars': sum(len(text) for text in texts),
+        'seconds_uncached': round(cold, 4),
+        'seconds_filling_cache': round(fill, 4),
+        'seconds_cached': round(warm, 4),
+        'pages_per_second_uncached': round(page_count / cold, 1),
+        'pages_per_second_cached': round(page_count / warm, 1),
+    }
+
+
+def bench_pdf_backends(pdf_paths):
+    # Brzina svakog backend-a bez keša i koliko se njegov tekst slaže sa pdfplumber-om (po redovima)
+    page_count = sum(int(pdf_path.rsplit('_', 1)[1].rstrip('p.pdf')) for pdf_path in pdf_paths)
+    results = {}
+    reference = None
+    for name in sorted(PDF_BACKENDS, key=lambda name: name != DEFAULT_PDF_BACKEND):
+        seconds, texts = timed(lambda: [anki_flash.read_pdf(pdf_path, pdf_backend=name) for pdf_path in pdf_paths])
+        if reference is None:
+            reference = texts
+        matchers = [difflib.SequenceMatcher(None, expected.splitlines(), text.splitlines(), autojunk=False)
+                    for expected, text in zip(reference, texts)]
+        results[name] = {'seconds': round(seconds, 4), 'pages_per_second': round(page_count / seconds, 1),
+                         'identical_pdfs': sum(expected == text for expected, text in zip(reference, texts)),
+                         'line_match': round(sum(matcher.ratio() for matcher in matchers) / len(matchers), 4)}
+    for name in results:
+        results[name]['speedup'] = round(results[DEFAULT_PDF_BACKEND]['seconds'] / results[name]['seconds'], 1)
+    results['pdfs'] = len(pdf_paths)
+    results['pages'] = page_count
+    return results
+
+
+def bench_chunk_text(size):
+    results = {}
+    for label, long_runs, paragraphs in (('line_breaks', False, False), ('unbroken_runs', True, True)):
+        text = synthetic_text(size, long_runs=long_runs, paragraphs=paragraphs)
+        seconds, chunks = timed(lambda: anki_flash.chunk_text(text, target_size=anki_flash.CHUNK_TARGET_SIZE))
+        results[label] = {'chars': len(text), 'chunks': len(chunks), 'seconds': round(seconds, 4),
+                          'mb_per_second': round(len(text) / seconds / 1e6, 2)}
+    return results
+
+
+def bench_chunk_edit(size, edits=20):
+    # Tekst prelomljen na redove od 80 karaktera, kao iz pdfplumber-a; svaka izmena ubacuje i briše
+    # nekoliko karaktera u prvoj desetini teksta, a broje se delovi kojih nema u prvobitnom deljenju
+    text = '\n'.join(textwrap.wrap(synthetic_text(size, paragraphs=False).replace('\n', ' '), 80))
+    chunkers = {
+        'fixed': lambda t: anki_flash.chunk_text(t, target_size=anki_flash.CHUNK_TARGET_SIZE),
+        'content_defined': lambda t: anki_flash.chunk_text_content_defined(t, target_size=anki_flash.CHUNK_TARGET_SIZE),
+    }
+    results = {}
+    for label, chunker in chunkers.items():
+        seconds, original = timed(lambda: chunker(text))
+        known = set(original)
+        rng = random.Random(0)
+        changed = 0
+        for _ in range(edits):
+            position = rng.randrange(len(text) // 10)
+            edited = text[:position] + 'ispravka' * rng.randint(0, 3) + text[position + rng.randint(1, 30):]
+            changed += sum(chunk not in known for chunk in chunker(edited))
+        results[label] = {'chunks': len(original), 'seconds': round(seconds, 4),
+                          'changed_chunks_per_edit': round(changed / edits, 2),
+                          'cache_hit_rate_after_edit': round(1 - changed / edits / len(original), 4)}
+    return results
+
+
+def bench_post_process(card_count):
+    lines = []
+    for index in range(card_count):
+        prefix = f"{index % 30 + 1}. " if index % 3 == 0 else ""
+        lines.append(f"{prefix}Šta je pojam {index} u lekciji?|Pojam {index} je deo gradiva.")
+        if index % 10 == 0:
+            lines.append("")
+    raw = '\n'.join(lines)
+    seconds, processed = timed(lambda: anki_flash.post_process_flashcards(raw))
+    return {'cards_in': card_count, 'cards_out': len(processed.split('\n')), 'seconds': round(seconds, 4),
+            'cards_per_second': round(card_count / seconds, 1)}
+
+
+# Parovi kartica koji se razlikuju u jednoj kratkoj reči, a nisu duplikati; deduplikacija mora da ih ostavi
+DISTINCT_CARD_PAIRS = [
+    ("Koja je uloga registra A?|Akumulator čuva rezultat ALU operacije.",
+     "Koja je uloga registra B?|Pomoćni registar za drugi operand."),
+    ("Šta sadrži registar R1 posle instrukcije?|Adresu sledeće instrukcije.",
+     "Šta sadrži registar R2 posle instrukcije?|Broj ponavljanja petlje."),
+    ("Šta radi instrukcija ADD?|Sabira dva operanda.", "Šta radi instrukcija SUB?|Oduzima drugi operand od prvog."),
+    ("Kolika je memorija sastavljena od 8 čipova?|8 KB.", "Kolika je memorija sastavljena od 16 čipova?|16 KB."),
+]
+
+
+def bench_dedup(card_count):
+    # Svaka deseta kartica ponavlja pitanje drugim slovima i interpunkcijom, svaka deseta ga malo proširuje.
+    # Svako pitanje ima i dva izmišljena pojma, jer se nasumična pitanja iz malog rečnika inače preklapaju
+    rng = random.Random(0)
+
+    def term():
+        return ''.join(rng.choice('bcdfgklmnprstvz') + rng.choice('aeiou') for _ in range(3))
+
+    lines = []
+    originals = []
+    rephrased = []
+    for index in range(card_count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(3, 8))] + [term(), term()]
+        rng.shuffle(words)
+        question = ' '.join(words).capitalize() + '?'
+        originals.append(f"{question}|Odgovor {index}.")
+        lines.append(originals[-1])
+        if index % 10 == 0:
+            lines.append(f"{question.upper().replace('?', ' ?')}|Isto pitanje.")
+        elif index % 10 == 1:
+            rephrased.append(f"{question[:-1]} u računaru?|Odgovor {index}.")
+            lines.append(rephrased[-1])
+    seconds, deduplicated = timed(lambda: deduplicate_cards(lines))
+    kept = set(deduplicated)
+    rephrased_kept = sum(card in kept for card in rephrased)
+    originals_dropped = sum(card not in kept for card in originals)
+    distinct_dropped = sum(len(deduplicate_cards(list(pair))) != 2 for pair in DISTINCT_CARD_PAIRS)
+    if distinct_dropped:
+        raise AssertionError(f"deduplication dropped {distinct_dropped} of {len(DISTINCT_CARD_PAIRS)} distinct pairs")
+    if rephrased_kept > len(rephrased) * 0.05:
+        raise AssertionError(f"deduplication kept {rephrased_kept} of {len(rephrased)} rephrased questions")
+    if originals_dropped > len(originals) * 0.01:
+        raise AssertionError(f"deduplication dropped {originals_dropped} of {len(originals)} distinct questions")
+    return {'cards_in': len(lines), 'cards_out': len(deduplicated), 'seconds': round(seconds, 4),
+            'cards_per_second': round(len(lines) / seconds, 1), 'distinct_pairs_kept': len(DISTINCT_CARD_PAIRS),
+            'rephrased_removed': len(rephrased) - rephrased_kept, 'distinct_questions_dropped': originals_dropped}
+
+
+def bench_cache(work_dir, entry_count):
+    cache = open_cache(os.path.join(work_dir, 'bench_api_cache.db'))
+    value = '\n'.join(f"Pitanje {index}?|Odgovor {index}" for index in range(20))
+    keys = [make_cache_key('bench', index) for index in range(entry_count)]
+    try:
+        put_seconds, _ = timed(lambda: [cache.put(key, value) for key in keys])
+        get_seconds, _ = timed(lambda: [cache.get(key) for key in keys])
+        miss_seconds, _ = timed(lambda: [cache.get(key + 'x') for key in keys])
+        reopen_seconds, _ = timed(lambda: open_cache(cache.path).close())
+    finally:
+        cache.close()
+    return {'entries': entry_count,
+            'puts_per_second': round(entry_count / put_seconds, 1),
+            'hits_per_second': round(entry_count / get_seconds, 1),
+            'misses_per_second': round(entry_count / miss_seconds, 1),
+            'open_seconds': round(reopen_seconds, 4)}
+
+
+def bench_end_to_end(pdf_paths, work_dir, server, concurrency):
+    anki_flash.CACHE_FILE = os.path.join(work_dir, 'e2e_api_cache.db')
+    anki_flash.EXTRACTION_CACHE_FILE = os.path.join(work_dir, 'e2e_extraction_cache.db')
+    anki_flash.client = Mistral(api_key='benchmark', server_url=server.url)
+    results = {}
+    for label in ('cold', 'warm_cache'):
+        chunk_totals = []
+
+        def progress_callback(pdf_path, current_index, total, stage):
+            if stage == 'generating':
+                chunk_totals.append(total)
+
+        requests_before = server.stats['requests']
+        seconds, flashcards = timed(lambda: anki_flash.process_multiple_pdfs(
+            pdf_paths, progress_callback, max_concurrent_requests=concurrency))
+        cards = len(flashcards.split('\n')) if flashcards else 0
+        chunks = chunk_totals[-1] if chunk_totals else 0
+        results[label] = {'seconds': round(seconds, 3), 'chunks': chunks, 'cards': cards,
+                          'api_requests': server.stats['requests'] - requests_before,
+                          'chunks_per_second': round(chunks / seconds, 2),
+                          'cards_per_second': round(cards / seconds, 1)}
+    results['concurrency'] = concurrency
+    results['mock_server'] = {'latency': server.latency, 'error_rate': server.error_rate,
+                              'rate_limit_rate': server.rate_limit_rate, 'short_rate': server.short_rate,
+                              'tail_rate': server.tail_rate, 'requests_per_minute': server.requests_per_minute,
+                              'stats': dict(server.stats)}
+    return results
+
+
+def bench_memory(pdf_paths, work_dir, server, concurrency):
+    # Vršna memorija (tracemalloc) kad se špil samo upisuje u fajl; sa tri puta više PDF-ova treba da ostane ista
+    anki_flash.CACHE_FILE = os.path.join(work_dir, 'memory_api_cache.db')
+    anki_flash.EXTRACTION_CACHE_FILE = os.path.join(work_dir, 'memory_extraction_cache.db')
+    anki_flash.client = Mistral(api_key='benchmark', server_url=server.url)
+    results = {}
+    for copies in (1, 3):
+        output_path = os.path.join(work_dir, f'memory_{copies}.txt')
+        tracemalloc.start()
+        try:
+            seconds, _ = timed(lambda: anki_flash.process_multiple_pdfs(
+                pdf_paths * copies, max_concurrent_requests=concurrency, extraction_workers=1,
+                output_path=output_path, collect_cards=False))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        results[f'pdfs_x{copies}'] = {'pdfs': len(pdf_paths) * copies, 'seconds': round(seconds, 3),
+                                      'peak_mb': round(peak / 1e6, 2)}
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIRECTORY,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def print_comparison(previous, current):
+    old = flatten(previous['results'])
+    new = flatten(current['results'])
+    print(f"{'metric':60} {'previous':>12} {'current':>12} {'ratio':>7}")
+    for name in sorted(set(old) & set(new)):
+        ratio = new[name] / old[name] if old[name] else float('nan')
+        print(f"{name:60} {old[name]:>12} {new[name]:>12} {ratio:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="smaller corpus and shorter mock latency")
+    parser.add_argument('--output', help="where to write the JSON results")
+    parser.add_argument('--compare', help="previous results JSON to compare against")
+    parser.add_argument('--concurrency', type=int, default=anki_flash.MAX_CONCURRENT_REQUESTS)
+    parser.add_argument('--latency', type=float, default=None, help="mock server mean latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--short-rate', type=float, default=0.0,
+                        help="fraction of mock responses with too few cards (exercises top-up requests)")
+    parser.add_argument('--tail-rate', type=float, default=0.0,
+                        help="fraction of mock responses that take 10x the mean latency")
+    parser.add_argument('--hedge', type=float, default=None, metavar='BUDGET',
+                        help="enable request hedging with this budget for the end-to-end runs")
+    parser.add_argument('--server-rpm', type=int, default=None,
+                        help="mock server answers requests over this many per minute with 429")
+    parser.add_argument('--requests-per-minute', type=float, default=None,
+                        help="client-side shared request budget for the end-to-end runs")
+    args = parser.parse_args()
+
+    page_counts = (6, 12, 20) if args.quick else (8, 20, 40, 60)
+    anki_flash.set_hedging(args.hedge)
+    latency = args.latency if args.latency is not None else (0.05 if args.quick else 0.3)
+
+    with tempfile.TemporaryDirectory(prefix='met_bench_') as work_dir:
+        pdf_paths = build_corpus(os.path.join(work_dir, 'corpus'), page_counts)
+        # Sopstveni budžet, da 429 mock servera ne pauzira druge procese sa istim API ključem
+        anki_flash.RATE_BUDGET_FILE = os.path.join(work_dir, 'rate_budget.db')
+        anki_flash.set_rate_limit(args.requests_per_minute)
+        server = start_mock_server(latency=latency, latency_jitter=latency / 3, error_rate=args.error_rate,
+                                   rate_limit_rate=args.rate_limit_rate, retry_after=0, seed=0,
+                                   short_rate=args.short_rate, tail_rate=args.tail_rate, tail_latency=latency * 10,
+                                   requests_per_minute=args.server_rpm)
+        try:
+            results = {
+                'startup': bench_startup(work_dir),
+                'read_pdf': bench_read_pdf(pdf_paths, work_dir),
+                'pdf_backends': bench_pdf_backends(pdf_paths),
+                'chunk_text': bench_chunk_text(512 * 1024 if args.quick else 4 * 1024 * 1024),
+                'chunk_edit': bench_chunk_edit(256 * 1024 if args.quick else 1024 * 1024),
+                'post_process_flashcards': bench_post_process(20000 if args.quick else 200000),
+                'dedup': bench_dedup(20000 if args.quick else 100000),
+                'cache': bench_cache(work_dir, 2000 if args.quick else 20000),
+                'end_to_end': bench_end_to_end(pdf_paths, work_dir, server, args.concurrency),
+                'memory': bench_memory(pdf_paths, work_dir, server, args.concurrency),
+            }
+        finally:
+            server.shutdown()
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': args.quick,
+        'results': results,
+    }
+
+    output = args.output or os.path.join(BENCHMARK_DIRECTORY, 'results', time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
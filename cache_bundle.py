@@ -0,0 +1,64 @@
+import gzip
+import json
+import os
+import time
+
+# Oznaka formata u zaglavlju; povećati BUNDLE_VERSION kad se promeni oblik unosa
+BUNDLE_FORMAT = 'met-flashcard-cache'
+BUNDLE_VERSION = 1
+
+
+def export_bundle(cache, path, keys=None, metadata=None):
+    """Write the entries of ``cache`` (only ``keys``, if given) to a gzip-compressed bundle; returns the count.
+
+    A bundle is JSON lines: a header with ``BUNDLE_FORMAT``, the version and
+    ``metadata`` (model, prompt version, source PDFs), then one
+    ``{"key", "cards", "created_at"}`` object per entry. Keys are the cache's
+    content hashes, so a bundle holds no chunk text and entries from
+    different machines merge without collisions.
+    """
+    header = {'format': BUNDLE_FORMAT, 'version': BUNDLE_VERSION, 'created_at': time.time()}
+    header.update(metadata or {})
+    count = 0
+    temp_path = path + '.tmp'
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps(header, ensure_ascii=False) + '\n')
+        for key, value, created_at in cache.iter_entries(keys):
+            f.write(json.dumps({'key': key, 'cards': value, 'created_at': created_at}, ensure_ascii=False) + '\n')
+            count += 1
+    # Nedovršen bundle (prekid, pun disk) nikad ne zameni postojeći
+    os.replace(temp_path, path)
+    return count
+
+
+def _parse_header(line, path):
+    try:
+        header = json.loads(line)
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"{path} is not a flashcard cache bundle")
+    if header.get('version', 0) > BUNDLE_VERSION:
+        raise ValueError(f"{path} was written by a newer version (bundle version {header['version']})")
+    return header
+
+
+def import_bundle(cache, path, conflict='keep'):
+    """Merge a bundle into ``cache`` (see ``FlashcardCache.merge_entries`` for ``conflict``).
+
+    Returns ``(header, counts)``. The merge is one transaction, so a
+    damaged bundle raises without importing anything.
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = _parse_header(f.readline(), path)
+
+        def entries():
+            for line_number, line in enumerate(f, start=2):
+                try:
+                    entry = json.loads(line)
+                    yield entry['key'], entry['cards'], float(entry['created_at'])
+                except (ValueError, KeyError, TypeError):
+                    raise ValueError(f"{path}: damaged entry on line {line_number}") from None
+
+        counts = cache.merge_entries(entries(), conflict)
+    return header, counts
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Posle koliko upisa se ponovo proverava da li keš prelazi zadata ograničenja
+EVICTION_INTERVAL = 100
+# Pravila kad uvezeni unos ima isti ključ kao lokalni, a različite kartice
+MERGE_CONFLICT_RULES = ('keep', 'replace', 'newer')
+
+
+def make_cache_key(*parts):
+    """SHA-256 over the JSON encoding of ``parts``, used as a content address."""
+    payload = json.dumps(parts, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SqliteStore:
+    """Base for the on-disk caches: one WAL-mode SQLite file, one connection per thread.
+
+    WAL plus a busy timeout lets several threads and several processes
+    (GUI + CLI) share the same file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def _connection(self):
+        # sqlite3 konekcije ne treba deliti između niti, pa svaka nit dobija svoju
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+class FlashcardCache(SqliteStore):
+    """Key/value store for generated flashcards.
+
+    Keys are content hashes (see ``make_cache_key``), so a lookup is a single
+    indexed query and a write touches only one row instead of rewriting the
+    whole cache.
+    """
+
+    def __init__(self, path, max_entries=None, max_age_seconds=None):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._writes_since_eviction = 0
+
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS flashcards (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS flashcards_last_used ON flashcards (last_used)")
+        self.evict()
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute("SELECT value FROM flashcards WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE flashcards SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key, value):
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO flashcards (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+            (key, value, now, now))
+        self._writes_since_eviction += 1
+        if self._writes_since_eviction >= EVICTION_INTERVAL:
+            self.evict()
+
+    def __contains__(self, key):
+        row = self._connection().execute("SELECT 1 FROM flashcards WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM flashcards").fetchone()[0]
+
+    def evict(self):
+        """Drop entries older than ``max_age_seconds`` and the least recently used beyond ``max_entries``."""
+        self._writes_since_eviction = 0
+        conn = self._connection()
+        if self.max_age_seconds is not None:
+            conn.execute("DELETE FROM flashcards WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+        if self.max_entries is not None:
+            conn.execute("""
+                DELETE FROM flashcards WHERE key IN (
+                    SELECT key FROM flashcards ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def iter_entries(self, keys=None):
+        """Yield ``(key, value, created_at)`` for every entry, or only for those in ``keys``."""
+        conn = self._connection()
+        if keys is None:
+            yield from conn.execute("SELECT key, value, created_at FROM flashcards ORDER BY key")
+            return
+        for key in sorted(set(keys)):
+            row = conn.execute("SELECT value, created_at FROM flashcards WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                yield key, row[0], row[1]
+
+    def merge_entries(self, entries, conflict='keep'):
+        """Add ``(key, value, created_at)`` entries from another cache; returns counts of what happened.
+
+        A key that is already present with different cards is a conflict:
+        ``'keep'`` keeps the local cards, ``'replace'`` takes the incoming
+        ones and ``'newer'`` takes whichever was generated later. Everything
+        is written in one transaction.
+        """
+        if conflict not in MERGE_CONFLICT_RULES:
+            raise ValueError(f"Unknown conflict rule {conflict!r}; use one of {', '.join(MERGE_CONFLICT_RULES)}")
+        counts = {'added': 0, 'unchanged': 0, 'replaced': 0, 'kept': 0}
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, value, created_at in entries:
+                row = conn.execute("SELECT value, created_at FROM flashcards WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    outcome = 'added'
+                elif row[0] == value:
+                    outcome = 'unchanged'
+                elif conflict == 'replace' or (conflict == 'newer' and created_at > row[1]):
+                    outcome = 'replaced'
+                else:
+                    outcome = 'kept'
+                counts[outcome] += 1
+                if outcome in ('added', 'replaced'):
+                    conn.execute("INSERT OR REPLACE INTO flashcards (key, value, created_at, last_used) "
+                                 "VALUES (?, ?, ?, ?)", (key, value, created_at, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.evict()
+        return counts
+
+    def clear(self):
+        self._connection().execute("DELETE FROM flashcards")
+
+
+class ExtractionCache(SqliteStore):
+    """Per-page text extracted from PDFs, keyed by file content hash plus extraction settings.
+
+    Pages are stored as soon as they are extracted, so an interrupted read
+    picks up where it stopped. A document is marked complete once extraction
+    reached the last page or a stop marker; complete documents never touch
+    the PDF again.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_key TEXT PRIMARY KEY,
+                complete INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                doc_key TEXT NOT NULL,
+                page_num INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                is_stop INTEGER NOT NULL,
+                PRIMARY KEY (doc_key, page_num)
+            )
+        """)
+
+    def get_document(self, doc_key):
+        """Return ``(complete, {page_num: (text, is_stop)})``, or ``(False, {})`` for unknown documents."""
+        conn = self._connection()
+        row = conn.execute("SELECT complete FROM documents WHERE doc_key = ?", (doc_key,)).fetchone()
+        if row is None:
+            return False, {}
+        pages = {page_num: (text, bool(is_stop)) for page_num, text, is_stop in conn.execute(
+            "SELECT page_num, text, is_stop FROM pages WHERE doc_key = ?", (doc_key,))}
+        return bool(row[0]), pages
+
+    def warm_up(self):
+        """Read both primary-key indexes once, so the first lookups of a run hit the OS page cache."""
+        conn = self._connection()
+        conn.execute("SELECT COUNT(*) FROM documents INDEXED BY sqlite_autoindex_documents_1").fetchone()
+        conn.execute("SELECT COUNT(*) FROM pages INDEXED BY sqlite_autoindex_pages_1").fetchone()
+
+    def put_page(self, doc_key, page_num, text, is_stop=False):
+        conn = self._connection()
+        conn.execute("INSERT OR IGNORE INTO documents (doc_key, complete, created_at) VALUES (?, 0, ?)",
+                     (doc_key, time.time()))
+        conn.execute("INSERT OR REPLACE INTO pages (doc_key, page_num, text, is_stop) VALUES (?, ?, ?, ?)",
+                     (doc_key, page_num, text, int(is_stop)))
+
+    def mark_complete(self, doc_key):
+        conn = self._connection()
+        conn.execute("INSERT OR IGNORE INTO documents (doc_key, complete, created_at) VALUES (?, 0, ?)",
+                     (doc_key, time.time()))
+        conn.execute("UPDATE documents SET complete = 1 WHERE doc_key = ?", (doc_key,))
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute("DELETE FROM pages")
+        conn.execute("DELETE FROM documents")
+
+
+def _ensure_directory(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+def open_cache(path, max_entries=None, max_age_seconds=None):
+    _ensure_directory(path)
+    return FlashcardCache(path, max_entries=max_entries, max_age_seconds=max_age_seconds)
+
+
+def open_extraction_cache(path):
+    _ensure_directory(path)
+    return ExtractionCache(path)
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
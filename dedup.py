@@ -0,0 +1,151 @@
+import re
+import unicodedata
+import zlib
+from collections import deque
+
+# Podrazumevani prag sličnosti pitanja (udeo reči kraćeg pitanja koje ima i duže) iznad kog je kartica duplikat;
+# preformulisano pitanje sa dodatim rečima ("Šta je to registar u procesoru?") ima 1.0
+DEDUP_THRESHOLD = 0.85
+# Kraća pitanja se porede samo tačno, jer su sadržana u previše drugih
+DEDUP_MIN_WORDS = 3
+# Kratke reči koje ne razlikuju pitanja; ostale kratke reči (A, R1, ADD, 16) jesu oznake i pitanja
+# koja se u njima razlikuju nikad nisu duplikati
+FUNCTION_WORDS = frozenset(
+    "i u a o s k v sa ka na za od do je se da li to su iz po ne ni ko sta sto kao pri bez nad pod ili ali jer "
+    "kad dok ako gde sve taj ta te ti tu mu ga im ih joj ova ovo ovi ove ono kom cim njen".split())
+# LSH: potpis od BANDS * ROWS minimuma; kartice su kandidati ako se poklope u bar jednoj traci.
+# Kratke trake, jer pitanje sa nekoliko dodatih reči ima Jaccard sličnost tek oko 0.5
+LSH_BANDS = 16
+LSH_ROWS = 2
+# Koliko poslednjih kartica pamti svaka korpa; šablonska pitanja ("Šta je X?") inače prave
+# korpe koje rastu sa špilom, a duplikati ionako dolaze iz susednih delova teksta
+LSH_BUCKET_SIZE = 16
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def _strip_diacritics(text):
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def normalize_question(question):
+    """Casefold, drop diacritics and punctuation and collapse whitespace."""
+    return _NON_WORD.sub(' ', _strip_diacritics(question.casefold())).strip()
+
+
+def question_markers(question):
+    """Normalized words of ``question`` that name a specific thing: numbers, short words and capitalized tokens."""
+    words = _NON_WORD.sub(' ', _strip_diacritics(question)).split()
+    # Pitanje pisano samo velikim slovima ne govori ništa o oznakama
+    shouting = all(word.isupper() for word in words if not word.isdigit())
+    markers = set()
+    for position, word in enumerate(words):
+        folded = word.casefold()
+        if (any(char.isdigit() for char in word) or (len(folded) <= 3 and folded not in FUNCTION_WORDS)
+                or (not shouting and word.isupper() and (position > 0 or len(word) > 1))):
+            markers.add(folded)
+    return markers
+
+
+def overlap(first, second):
+    """Share of the smaller set's items that are also in the larger one."""
+    if not first or not second:
+        return 1.0 if first == second else 0.0
+    return len(first & second) / min(len(first), len(second))
+
+
+class CardDeduplicator:
+    """Incremental filter that drops cards whose question repeats an earlier card.
+
+    Exact duplicates are caught by the normalized question; near duplicates
+    by the ``overlap`` of the question words, so a question rephrased with a
+    few added or reordered words matches the earlier one. Questions that
+    differ in a marker (see ``question_markers``: a register, an opcode, a
+    number) are never merged. Instead of comparing every pair, each card
+    gets a one-permutation MinHash signature split into LSH bands, and only
+    cards that share a band are compared exactly. Buckets keep only their
+    latest ``bucket_size`` cards, so the cost per card stays flat as the
+    deck grows.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, bands=LSH_BANDS, rows=LSH_ROWS, bucket_size=LSH_BUCKET_SIZE):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.bucket_size = bucket_size
+        self._bins = bands * rows
+        self._words = []
+        self._markers = []
+        self._exact = set()
+        self._buckets = [{} for _ in range(bands)]
+        self.kept = 0
+        self.removed = 0
+
+    def _signature(self, words):
+        bins = self._bins
+        signature = [None] * bins
+        for value in words:
+            index = value % bins
+            current = signature[index]
+            if current is None or value < current:
+                signature[index] = value
+        # Prazne korpe popunjavamo iz sledeće popunjene (densifikacija), da kratka pitanja ne bi sva
+        # delila iste prazne trake
+        for index in range(bins):
+            if signature[index] is None:
+                offset = 1
+                while signature[(index + offset) % bins] is None:
+                    offset += 1
+                signature[index] = (signature[(index + offset) % bins], offset)
+        return signature
+
+    def add(self, card):
+        """Return True if the card is new (and remember it), False if it duplicates an earlier one."""
+        question = card.partition('|')[0]
+        normalized = normalize_question(question)
+        if normalized in self._exact:
+            self.removed += 1
+            return False
+        words = frozenset(zlib.crc32(word.encode('utf-8')) for word in normalized.split())
+        if self.threshold >= 1.0 or len(words) < DEDUP_MIN_WORDS:
+            self._exact.add(normalized)
+            self.kept += 1
+            return True
+
+        markers = question_markers(question)
+        signature = self._signature(words)
+        rows = self.rows
+        band_keys = [hash(tuple(signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+        threshold = self.threshold
+        checked = set()
+        for band, key in enumerate(band_keys):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                # Dodata ili zamenjena oznaka ("registar A" / "registar B") čini drugu karticu
+                if markers == self._markers[candidate] and overlap(words, self._words[candidate]) >= threshold:
+                    self.removed += 1
+                    return False
+
+        card_id = len(self._words)
+        self._words.append(words)
+        self._markers.append(markers)
+        self._exact.add(normalized)
+        self.kept += 1
+        for band, key in enumerate(band_keys):
+            bucket = self._buckets[band].get(key)
+            if bucket is None:
+                bucket = self._buckets[band][key] = deque(maxlen=self.bucket_size)
+            bucket.append(card_id)
+        return True
+
+    def filter(self, cards):
+        return [card for card in cards if self.add(card)]
+
+
+def deduplicate_cards(cards, threshold=DEDUP_THRESHOLD):
+    """Drop repeated questions and near-duplicate cards, keeping the first occurrence and the original order."""
+    return CardDeduplicator(threshold).filter(cards)
@@ -1,22 +1,29 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
+import queue
 import threading
 import traceback
 import time
 from dotenv import load_dotenv
 from tinydb import TinyDB
 
-from anki_flash import save_to_file, clear_cache, process_multiple_pdfs, FlashcardGenerationError, UnauthorizedError
+from anki_flash import clear_cache, process_multiple_pdfs, journal_path_for, CancellationToken, \
+    FlashcardGenerationError, UnauthorizedError, batch_state_path_for, submit_batch_job, collect_batch_job, warm_up
+from batch_job import BatchJobState
+from metrics import RunMetrics
 
 load_dotenv()
 
+# Koliko često (u ms) glavna nit preuzima poruke radne niti i osvežava prozor
+UI_REFRESH_MS = 50
+
 
 class FlashcardGeneratorGUI:
     def __init__(self, master):
         self.master = master
         master.title("MET Flashcard Generator")
-        master.geometry("400x520")
+        master.geometry("400x550")
         master.resizable(False, False)
 
 
@@ -33,15 +40,23 @@ class FlashcardGeneratorGUI:
         self.output_path = tk.StringVar()
         self.output_name = tk.StringVar()
         self.stop_processing = False
+        self.cancel_token = CancellationToken()
 
         self.start_time = None
         self.is_processing = False
         self.total_chunks = 0
         self.processed_chunks = 0
+        self.chunked_pdfs = 0
+        self.total_pdfs = 0
         self.last_chunk_time = None
         self.current_pdf = None
         self.current_pdf_index = 0
 
+        # Tk nije bezbedan za niti: radna nit samo ostavlja poruke, a glavna ih primenjuje u pump_ui_events
+        self.ui_events = queue.Queue()
+        self.pending_progress = None
+        self.progress_lock = threading.Lock()
+
         self.create_widgets()
         self.style_config()
 
@@ -54,6 +69,42 @@ class FlashcardGeneratorGUI:
         self.chunking_complete = False
         self.api_key_modal_open = False
         self.api_key_entry = None
+        self.master.after(UI_REFRESH_MS, self.pump_ui_events)
+        # Teški moduli (pdfplumber, mistralai, tiktoken) se učitavaju tek kad se prozor prikaže
+        self.master.after_idle(lambda: threading.Thread(target=warm_up, daemon=True).start())
+
+    def post_ui(self, func, *args, **kwargs):
+        """Run ``func`` on the Tk main thread; safe to call from worker threads."""
+        self.ui_events.put((func, args, kwargs))
+
+    def post_progress(self, text=None, value=None):
+        # Uzastopni izveštaji o napretku se sažimaju: prikazuje se samo poslednji stigao pre osvežavanja
+        with self.progress_lock:
+            if self.pending_progress is None:
+                self.pending_progress = {}
+            if text is not None:
+                self.pending_progress['text'] = text
+            if value is not None:
+                self.pending_progress['value'] = value
+
+    def pump_ui_events(self):
+        with self.progress_lock:
+            pending_progress, self.pending_progress = self.pending_progress, None
+        # Napredak ide pre ostalih poruka, da ne bi pregazio završni status koji je stigao posle njega
+        if pending_progress:
+            if 'text' in pending_progress:
+                self.status_label.config(text=pending_progress['text'])
+            if 'value' in pending_progress:
+                self.progress.set(pending_progress['value'])
+        try:
+            while True:
+                try:
+                    func, args, kwargs = self.ui_events.get_nowait()
+                except queue.Empty:
+                    break
+                func(*args, **kwargs)
+        finally:
+            self.master.after(UI_REFRESH_MS, self.pump_ui_events)
 
 
     def open_api_key_modal(self):
@@ -89,6 +140,12 @@ class FlashcardGeneratorGUI:
         tk.Checkbutton(self.master, text="Clear cache before processing", variable=self.clear_cache_var,
                        font=self.label_font, bg=self.bg_color, fg=self.text_color).pack(pady=5)
 
+        # Batch mode option (cheaper, results are collected later)
+        self.batch_mode_var = tk.BooleanVar()
+        tk.Checkbutton(self.master, text="Overnight batch job (click Generate again to collect)",
+                       variable=self.batch_mode_var, font=self.label_font, bg=self.bg_color,
+                       fg=self.text_color).pack()
+
         # Generate button (initially disabled)
         self.generate_button = ttk.Button(self.master, text="Generate Flashcards", command=self.generate_flashcards,
                                           style='Blue.TButton', state='disabled')
@@ -213,12 +270,50 @@ class FlashcardGeneratorGUI:
             messagebox.showerror("Error", "Please select at least one PDF and the output file path.")
             return
 
+        # Radna nit ne sme da čita Tk promenljive, pa putanju uzimamo ovde
+        self.run_output_path = self.output_path.get()
+        batch_state_path = batch_state_path_for(self.run_output_path)
+        if os.path.exists(batch_state_path):
+            state = BatchJobState.load(batch_state_path)
+            same_pdfs = [os.path.abspath(path) for path in state.pdf_paths] == \
+                [os.path.abspath(path) for path in self.pdf_paths]
+            if same_pdfs:
+                # Prepisivanje je potvrđeno pri predaji; pitamo ponovo samo ako je fajl u međuvremenu menjan
+                if (os.path.exists(self.run_output_path)
+                        and os.path.getmtime(self.run_output_path) > state.submitted_at
+                        and not self.confirm_overwrite()):
+                    return
+                self.start_batch(batch_state_path)
+                return
+            if not messagebox.askyesno("Batch Job",
+                                       "A batch job for other PDFs was submitted for this output file. "
+                                       "Do you want to discard it and start over with the selected PDFs?"):
+                return
+            state.remove()
+
+        if self.batch_mode_var.get():
+            if not self.confirm_overwrite():
+                return
+            if self.clear_cache_var.get():
+                clear_cache()
+            self.start_batch(batch_state_path)
+            return
+
+        # Nedovršen posao za isti izlazni fajl može da se nastavi umesto da se kreće iz početka
+        self.resume_run = False
+        journal_path = journal_path_for(self.output_path.get())
+        if os.path.exists(journal_path):
+            self.resume_run = messagebox.askyesno("Resume",
+                                                  "An unfinished run was found for this output file. "
+                                                  "Do you want to resume it?")
+
         # Check if file exists and ask user what to do before processing
-        if os.path.exists(self.output_path.get()):
-            user_choice = messagebox.askyesno("File Exists",
-                                              "The output file already exists. Do you want to overwrite it?")
-            if not user_choice:
-                return  # User chose not to overwrite, so we stop here
+        if not self.resume_run and not self.confirm_overwrite():
+            return  # User chose not to overwrite, so we stop here
+
+        # Dnevnik se briše tek kad je novi posao potvrđen, inače bi odustajanje izgubilo nedovršen posao
+        if not self.resume_run and os.path.exists(journal_path):
+            os.remove(journal_path)
 
         self.reset_gui_state()
 
@@ -235,19 +330,91 @@ class FlashcardGeneratorGUI:
         self.stop_button.config(state='normal')
 
         # Start processing in a separate thread to keep GUI responsive
+        self.cancel_token = CancellationToken()
         self.status_label.config(text="Processing...")
         self.processing_thread = threading.Thread(target=self.process_pdfs_thread, daemon=True)
         self.processing_thread.start()
 
+    def confirm_overwrite(self):
+        if not os.path.exists(self.run_output_path):
+            return True
+        return messagebox.askyesno("File Exists", "The output file already exists. Do you want to overwrite it?")
+
+    def start_batch(self, batch_state_path):
+        # Batch posao: prvi klik ga predaje, sledeći (i posle ponovnog pokretanja programa) preuzimaju rezultate
+        self.reset_gui_state()
+        self.is_processing = True
+        self.stop_processing = False
+        self.generate_button.config(state='disabled')
+        self.stop_button.config(state='normal')
+        self.cancel_token = CancellationToken()
+        self.status_label.config(text="Checking batch job..." if os.path.exists(batch_state_path)
+                                 else "Submitting batch job...")
+        self.processing_thread = threading.Thread(target=self.process_batch_thread, args=(batch_state_path,),
+                                                  daemon=True)
+        self.processing_thread.start()
+
+    def process_batch_thread(self, batch_state_path):
+        def progress_callback(pdf_path, current_index, total, stage):
+            # Poziva se iz radne niti, kao i kod običnog generisanja
+            if not total:
+                return
+            if stage == 'chunking':
+                text = f"Chunking: {os.path.basename(pdf_path)} ({current_index + 1}/{total})"
+            elif stage == 'batch':
+                text = f"Batch job: {current_index + 1}/{total} requests done"
+            else:  # 'generating'
+                text = f"Collecting cards: Chunk {current_index + 1}/{total}"
+            self.post_progress(text, ((current_index + 1) / total) * 100)
+
+        try:
+            if not os.path.exists(batch_state_path):
+                state = submit_batch_job(self.pdf_paths, batch_state_path, output_path=self.run_output_path,
+                                         progress_callback=progress_callback, cancel_token=self.cancel_token)
+                if state is None:
+                    self.post_ui(self.status_label.config, text="Batch job was not submitted: stopped by user.",
+                                 fg="orange")
+                    return
+                if state.job_id is not None:
+                    self.post_ui(self.status_label.config,
+                                 text=f"Batch job submitted ({len(state.requests)} chunks). "
+                                      f"Click Generate Flashcards later to collect the cards.", fg="green")
+                    return
+            all_flashcards = collect_batch_job(batch_state_path, progress_callback=progress_callback,
+                                               cancel_token=self.cancel_token)
+            if all_flashcards is None and self.cancel_token.is_cancelled():
+                self.post_ui(self.status_label.config,
+                             text="Collection stopped by user. Click Generate Flashcards to continue.", fg="orange")
+                return
+            if all_flashcards is None:
+                self.post_ui(self.status_label.config, text="Batch job is still running. Try again later.",
+                             fg="orange")
+                return
+            total_cards = len(all_flashcards.split('\n')) if all_flashcards else 0
+            self.post_ui(messagebox.showinfo, "Success", f"Flashcards saved to {self.run_output_path}")
+            self.post_ui(self.status_label.config, text=f"Batch job completed. Generated {total_cards} cards.",
+                         fg="green")
+        except UnauthorizedError as e:
+            self.post_ui(self.handle_unauthorized_error, str(e))
+        except FlashcardGenerationError as e:
+            self.post_ui(self.handle_generation_error, str(e))
+        except Exception as e:
+            self.post_ui(self.handle_unexpected_error, str(e), traceback.format_exc())
+        finally:
+            self.is_processing = False
+            self.stop_processing = False
+            self.post_ui(self.generate_button.config, state='normal')
+            self.post_ui(self.stop_button.config, state='disabled')
+
     def stop_generation(self):
         if self.is_processing:
             self.stop_processing = True
+            self.cancel_token.cancel()
             self.status_label.config(text="Stopping generation...")
             self.stop_button.config(state='disabled')
 
     def update_progress(self, value):
-        self.progress.set(value)
-        self.master.update_idletasks()
+        self.post_progress(value=value)
 
     def reset_gui_state(self):
         """Reset the GUI state before starting a new process."""
@@ -259,55 +426,89 @@ class FlashcardGeneratorGUI:
         try:
             self.start_time = time.time()
             self.chunking_complete = False
+            self.total_chunks = 0
+            self.processed_chunks = 0
+            self.chunked_pdfs = 0
+            self.total_pdfs = len(self.pdf_paths)
+
+            self.last_chunk_time = None
+            self.chunk_processing_time = 0
+            run_metrics = RunMetrics()
 
-            def progress_callback(pdf_path, current_index, total, stage):
+            def progress_callback(pdf_path, current_index, total, stage, metrics=None):
+                # Poziva se iz radne niti: ništa od Tk-a se ne dira direktno, samo se ostavlja poslednje stanje
                 if self.stop_processing:
                     return False  # Signal to stop processing
+                # Chunking i generisanje se preklapaju: traka prati generisanje čim ono krene,
+                # a dok se PDF-ovi još čitaju, status prikazuje i koliko ih je obrađeno
                 if stage == 'chunking':
                     pdf_name = os.path.basename(pdf_path)
-                    self.status_label.config(text=f"Chunking: {pdf_name} ({current_index + 1}/{total})")
-                    progress = ((current_index + 1) / total) * 100
+                    self.chunked_pdfs = current_index + 1
+                    self.total_pdfs = total
+                    if self.total_chunks:
+                        return
+                    self.post_progress(f"Chunking: {pdf_name} ({current_index + 1}/{total})",
+                                       ((current_index + 1) / total) * 100)
                 elif stage == 'chunking_complete':
                     self.chunking_complete = True
-                    self.progress.set(0)  # Reset progress bar to 0
-                    self.status_label.config(text="Chunking complete. Starting card generation...")
-                    self.master.update_idletasks()
-                    return
+                    if not self.total_chunks:
+                        # Reset progress bar to 0
+                        self.post_progress("Chunking complete. Starting card generation...", 0)
                 else:  # 'generating'
-                    self.status_label.config(text=f"Generating cards: Chunk {current_index + 1}/{total}")
-                    progress = ((current_index + 1) / total) * 100
-
-                self.progress.set(progress)
-                self.master.update_idletasks()
-
-            all_flashcards = process_multiple_pdfs(self.pdf_paths, progress_callback)
+                    now = time.time()
+                    if self.last_chunk_time is not None:
+                        self.chunk_processing_time = now - self.last_chunk_time
+                    self.last_chunk_time = now
+                    self.total_chunks = total
+                    self.processed_chunks = current_index + 1
+                    status = f"Generating cards: Chunk {current_index + 1}/{total}"
+                    if not self.chunking_complete:
+                        status += f" (chunked {self.chunked_pdfs}/{self.total_pdfs} PDFs)"
+                    if metrics is not None:
+                        eta = metrics['eta_seconds']
+                        if eta is not None:
+                            status += f"\nETA {int(eta // 60)}m {int(eta % 60):02d}s"
+                            if metrics['chunks_per_minute']:
+                                status += f", {metrics['chunks_per_minute']:.1f} chunks/min"
+                    self.post_progress(status, ((current_index + 1) / total) * 100)
+
+            # Kartice se upisuju u izlazni fajl čim se delovi završe, a dnevnik omogućava nastavak posla
+            # Špil se ne drži u memoriji; broj kartica daju metrike
+            process_multiple_pdfs(self.pdf_paths, progress_callback, output_path=self.run_output_path,
+                                  journal_path=journal_path_for(self.run_output_path),
+                                  cancel_token=self.cancel_token, metrics=run_metrics, collect_cards=False)
             if self.stop_processing:
-                self.status_label.config(text="Generation stopped by user.", fg="orange")
+                # Završene kartice su već u izlaznom fajlu, a dnevnik ostaje za nastavak
+                saved_cards = run_metrics.counters.get('deck_cards', 0)
+                self.post_ui(self.status_label.config,
+                             text=f"Generation stopped by user. {saved_cards} finished cards were saved.",
+                             fg="orange")
             else:
-                total_cards = len(all_flashcards.split('\n'))
+                total_cards = run_metrics.counters.get('deck_cards', 0)
                 expected_min = 100 * len(self.pdf_paths)
                 expected_max = 200 * len(self.pdf_paths)
                 if total_cards < expected_min:
-                    messagebox.showwarning("Warning",
-                                           f"Only {total_cards} cards were generated, which is less than the expected minimum of {expected_min}.")
+                    self.post_ui(messagebox.showwarning, "Warning",
+                                 f"Only {total_cards} cards were generated, which is less than the expected minimum of {expected_min}.")
                 elif total_cards > expected_max:
-                    messagebox.showwarning("Warning",
-                                           f"{total_cards} cards were generated, which is more than the expected maximum of {expected_max}.")
+                    self.post_ui(messagebox.showwarning, "Warning",
+                                 f"{total_cards} cards were generated, which is more than the expected maximum of {expected_max}.")
 
-                self.save_flashcards(all_flashcards)
-                self.status_label.config(text=f"Processing completed. Generated {total_cards} cards.", fg="green")
+                self.post_ui(messagebox.showinfo, "Success", f"Flashcards saved to {self.run_output_path}")
+                self.post_ui(self.status_label.config, text=f"Processing completed. Generated {total_cards} cards.",
+                             fg="green")
 
         except UnauthorizedError as e:
-            self.handle_unauthorized_error(str(e))
+            self.post_ui(self.handle_unauthorized_error, str(e))
         except FlashcardGenerationError as e:
-            self.handle_generation_error(str(e))
+            self.post_ui(self.handle_generation_error, str(e))
         except Exception as e:
-            self.handle_unexpected_error(str(e))
+            self.post_ui(self.handle_unexpected_error, str(e), traceback.format_exc())
         finally:
             self.is_processing = False
             self.stop_processing = False
-            self.generate_button.config(state='normal')
-            self.stop_button.config(state='disabled')
+            self.post_ui(self.generate_button.config, state='normal')
+            self.post_ui(self.stop_button.config, state='disabled')
 
     def handle_unauthorized_error(self, error_message):
         self.progressbar.configure(style="Red.Horizontal.TProgressbar")
@@ -325,24 +526,13 @@ class FlashcardGeneratorGUI:
         messagebox.showerror("Error", f"Flashcard generation failed:\n\n{error_message}")
         self.generate_button.config(state='normal')  # Re-enable the generate button to allow retry
 
-    def handle_unexpected_error(self, error_message):
+    def handle_unexpected_error(self, error_message, stack_trace=None):
         self.progressbar.configure(style="Red.Horizontal.TProgressbar")
         self.status_label.config(text="An unexpected error occurred", fg="red")
-        error_details = f"An unexpected error occurred:\n\n{error_message}\n\nStack Trace:\n{traceback.format_exc()}"
+        # Greške iz radne niti donose svoj stack trace, jer ga glavna nit više ne vidi
+        error_details = f"An unexpected error occurred:\n\n{error_message}\n\nStack Trace:\n{stack_trace or traceback.format_exc()}"
         messagebox.showerror("Unexpected Error", error_details)
         self.generate_button.config(state='normal')  # Re-enable the generate button to allow retry
-    def save_flashcards(self, flashcards):
-        if not self.output_path.get():
-            messagebox.showerror("Error", "Please select an output file path.")
-            return
-
-        try:
-            # Split the flashcards string into a list of individual flashcards
-            flashcard_list = flashcards.split('\n')
-            save_to_file(flashcard_list, self.output_path.get())
-            messagebox.showinfo("Success", f"Flashcards saved to {self.output_path.get()}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save flashcards: {str(e)}")
     def save_api_key_to_db(self, api_key):
         db = TinyDB('api_keys.json')
         db.insert({'api_key': api_key}) # TODO NAMESTI TINY DB MRZI ME AAAAAAAAAAAAAAAAAAAAAAA
@@ -0,0 +1,137 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from metrics import Histogram
+
+# Duplikat zahteva se šalje kad prvi traje duže od ovog percentila skorašnjih kašnjenja
+HEDGE_PERCENTILE = 0.95
+# Dok nema toliko izmerenih odgovora ne znamo šta je "sporo", pa se ne duplira
+HEDGE_MIN_SAMPLES = 20
+# Ni kad su odgovori brzi ne dupliramo pre ovoliko sekundi
+HEDGE_MIN_DELAY = 1.0
+# Najviše ovoliki deo zahteva sme da dobije duplikat; to je gornja granica dodatnog troška
+HEDGE_MAX_EXTRA_FRACTION = 0.1
+
+
+class HedgePolicy:
+    """Decides when a slow request gets a duplicate, learning what "slow" is from recent latencies.
+
+    ``delay`` is the ``percentile`` of recently observed latencies (never
+    below ``min_delay``), or None until ``min_samples`` have been seen.
+    ``try_hedge`` keeps the duplicates under ``max_extra_fraction`` of all
+    requests started through the policy. One policy is shared by every run
+    in the process, so later runs start with what earlier ones learned.
+    """
+
+    def __init__(self, percentile=HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES, min_delay=HEDGE_MIN_DELAY,
+                 max_extra_fraction=HEDGE_MAX_EXTRA_FRACTION):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_extra_fraction = max_extra_fraction
+        self.latencies = Histogram()
+        self.requests = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def observe(self, latency):
+        with self._lock:
+            self.latencies.observe(latency)
+
+    def delay(self):
+        with self._lock:
+            if self.latencies.count < self.min_samples:
+                return None
+            return max(self.min_delay, self.latencies.percentile(self.percentile))
+
+    def start_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def try_hedge(self):
+        with self._lock:
+            if self.hedges + 1 > self.max_extra_fraction * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+
+def _start_thread(function, *args):
+    # Svaki poziv dobija svoju nit: deljeni pool bi ograničio broj zahteva u letu, a zahtevi koji su izgubili
+    # trku bi zauzimali njegove niti do isteka vremena za odgovor
+    future = Future()
+    future.set_running_or_notify_cancel()
+
+    def run():
+        try:
+            result = function(*args)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    threading.Thread(target=run, name='hedge', daemon=True).start()
+    return future
+
+
+def call_hedged(call, policy, cancel_token=None, metrics=None, hedge_call=None, poll_interval=0.2):
+    """Run ``call()`` on its own thread and fire ``hedge_call()`` if it takes longer than ``policy.delay()``.
+
+    ``hedge_call`` defaults to ``call``. The first successful result wins.
+    A blocking HTTP request cannot be interrupted from another thread, so
+    the losing call is left to finish on its thread and its result is
+    dropped. If every call fails, the first error is raised. ``metrics``
+    counts ``hedges_fired`` and ``hedges_won`` and records in
+    ``hedge_latency_saved`` how much sooner a winning hedge answered than
+    the request it duplicated.
+    """
+    policy.start_request()
+
+    def timed(function):
+        start = time.perf_counter()
+        result = function()
+        policy.observe(time.perf_counter() - start)
+        return result
+
+    hedge_delay = policy.delay()
+    hedge_at = time.perf_counter() + hedge_delay if hedge_delay is not None else None
+    primary = _start_thread(timed, call)
+    futures = [primary]
+    hedge = None
+    first_error = None
+    while True:
+        timeout = poll_interval
+        if hedge_at is not None:
+            timeout = min(timeout, max(0.0, hedge_at - time.perf_counter()))
+        done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in sorted(done, key=futures.index):
+            futures.remove(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                if first_error is None:
+                    first_error = e
+                continue
+            if future is hedge and metrics is not None:
+                metrics.increment('hedges_won')
+                won_at = time.perf_counter()
+
+                def record_saving(loser):
+                    if loser.exception() is None:
+                        metrics.observe('hedge_latency_saved', time.perf_counter() - won_at)
+
+                primary.add_done_callback(record_saving)
+            return result
+        if not futures:
+            raise first_error
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        # Posle greške prvog zahteva duplikat nema smisla; to rešava ponovni pokušaj
+        if hedge_at is not None and time.perf_counter() >= hedge_at:
+            hedge_at = None
+            if first_error is None and policy.try_hedge():
+                hedge = _start_thread(timed, hedge_call or call)
+                futures.append(hedge)
+                if metrics is not None:
+                    metrics.increment('hedges_fired')
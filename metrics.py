@@ -0,0 +1,178 @@
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Granice (u sekundama) za histogram kašnjenja API zahteva
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+# Koliko poslednjih merenja čuvamo za percentile
+RECENT_SAMPLES = 500
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentile(self, fraction):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(math.ceil(fraction * len(ordered))) - 1)]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': round(self.total, 4),
+            'mean': round(self.total / self.count, 4) if self.count else None,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p95': self.percentile(0.95),
+            'buckets': {str(bound): count for bound, count in zip(self.buckets + ('+Inf',), self.counts)},
+        }
+
+
+class RunMetrics:
+    """Thread-safe counters, per-stage timers and latency histograms for one generation run.
+
+    Stage times are summed across workers, so with concurrency they can add
+    up to more than the wall-clock time; ``elapsed`` is the wall clock.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.generation_started = None
+        self.finished = None
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage_time(name, time.perf_counter() - start)
+
+    def add_stage_time(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def percentile(self, name, fraction):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            return histogram.percentile(fraction) if histogram else None
+
+    def mark_generation_started(self):
+        with self._lock:
+            if self.generation_started is None:
+                self.generation_started = time.time()
+
+    def finish(self):
+        self.finished = time.time()
+
+    def eta_seconds(self):
+        """Remaining time estimated from the chunk throughput seen so far, or None before the first chunk."""
+        with self._lock:
+            done = self.counters.get('chunks_done', 0)
+            total = self.gauges.get('chunks_total', 0)
+            pdfs_total = self.gauges.get('pdfs_total', 0)
+            pdfs_chunked = self.gauges.get('pdfs_chunked', 0)
+            generation_started = self.generation_started
+        if not done or generation_started is None:
+            return None
+        # Dok se PDF-ovi još dele, ukupan broj delova procenjujemo srazmerno broju podeljenih PDF-ova
+        if pdfs_chunked and pdfs_chunked < pdfs_total:
+            total = total * pdfs_total / pdfs_chunked
+        per_chunk = (time.time() - generation_started) / done
+        return max(0.0, (total - done) * per_chunk)
+
+    def snapshot(self):
+        elapsed = (self.finished or time.time()) - self.started
+        eta = self.eta_seconds()
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            stages = {name: round(seconds, 4) for name, seconds in self.stages.items()}
+            histograms = {name: histogram.summary() for name, histogram in self.histograms.items()}
+        lookups = counters.get('cache_hits', 0) + counters.get('cache_misses', 0)
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'eta_seconds': round(eta, 1) if eta is not None else None,
+            'chunks_per_minute': round(counters.get('chunks_done', 0) / elapsed * 60, 2) if elapsed else None,
+            'cards_per_minute': round(counters.get('cards', 0) / elapsed * 60, 2) if elapsed else None,
+            'cache_hit_rate': round(counters.get('cache_hits', 0) / lookups, 4) if lookups else None,
+            'stages': stages,
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': histograms,
+        }
+
+    def export_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def export_prometheus(self, path, prefix='met_flashcards'):
+        """Write the metrics in the Prometheus text exposition format (for node_exporter's textfile collector)."""
+        snapshot = self.snapshot()
+        lines = [f"# TYPE {prefix}_elapsed_seconds gauge", f"{prefix}_elapsed_seconds {snapshot['elapsed_seconds']}"]
+        lines.append(f"# TYPE {prefix}_stage_seconds_total counter")
+        for name, seconds in sorted(snapshot['stages'].items()):
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{name}"}} {seconds}')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        with self._lock:
+            histograms = list(self.histograms.items())
+        for name, histogram in sorted(histograms):
+            metric = f"{prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum {round(histogram.total, 4)}")
+            lines.append(f"{metric}_count {histogram.count}")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def export(self, path):
+        if path.endswith('.prom'):
+            self.export_prometheus(path)
+        else:
+            self.export_json(path)
@@ -0,0 +1,82 @@
+import os
+import threading
+
+# Ograničenja po zahtevu (u sekundama); generisanje kartica za veliki deo teksta ume da traje i minut
+REQUEST_CONNECT_TIMEOUT = 10.0
+REQUEST_READ_TIMEOUT = 120.0
+REQUEST_WRITE_TIMEOUT = 30.0
+# Koliko dugo neiskorišćena keep-alive konekcija ostaje otvorena
+KEEPALIVE_EXPIRY = 60.0
+
+
+class MistralClientManager:
+    """Owns the Mistral client and the pooled keep-alive HTTP client under it.
+
+    The HTTP pool has one connection per concurrent request, so generation
+    threads reuse TLS connections instead of handshaking per chunk, and
+    every request gets connect/read/write timeouts so a stalled response
+    cannot hang a worker forever. ``get`` rebuilds the client when
+    ``MISTRAL_API_KEY`` or ``MISTRAL_SERVER_URL`` changed (for example after
+    the GUI saved a new key), a bigger pool is needed or ``read_timeout``
+    was changed. Replaced HTTP clients are not closed right away, because
+    requests may still be in flight on them; they are closed by ``close``.
+    """
+
+    def __init__(self, pool_size=4, read_timeout=REQUEST_READ_TIMEOUT):
+        self.pool_size = pool_size
+        self.read_timeout = read_timeout
+        self._client = None
+        self._http_client = None
+        self._settings = None
+        self._retired = []
+        self._lock = threading.Lock()
+
+    def _current_settings(self):
+        return (os.getenv('MISTRAL_API_KEY'), os.getenv('MISTRAL_SERVER_URL') or None, self.pool_size,
+                self.read_timeout)
+
+    def get(self):
+        settings = self._current_settings()
+        client = self._client
+        if client is not None and settings == self._settings:
+            return client
+        with self._lock:
+            if self._client is None or self._current_settings() != self._settings:
+                self._rebuild()
+            return self._client
+
+    def ensure_pool_size(self, pool_size):
+        """Grow the connection pool to at least ``pool_size``; the client is rebuilt on the next ``get``."""
+        with self._lock:
+            if pool_size > self.pool_size:
+                self.pool_size = pool_size
+
+    def _rebuild(self):
+        import httpx
+        from mistralai import Mistral
+
+        api_key, server_url, pool_size, read_timeout = settings = self._current_settings()
+        http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                                keepalive_expiry=KEEPALIVE_EXPIRY),
+            timeout=httpx.Timeout(connect=REQUEST_CONNECT_TIMEOUT, read=read_timeout,
+                                  write=REQUEST_WRITE_TIMEOUT, pool=read_timeout),
+        )
+        if self._client is not None:
+            self._retired.append(self._http_client)
+        # MISTRAL_SERVER_URL služi za lokalni mock server u benchmark-ovima
+        self._client = Mistral(api_key=api_key, server_url=server_url, client=http_client,
+                               timeout_ms=int(read_timeout * 1000))
+        self._http_client = http_client
+        self._settings = settings
+
+    def close(self):
+        with self._lock:
+            http_clients = self._retired
+            if self._client is not None:
+                http_clients.append(self._http_client)
+            self._client = None
+            self._settings = None
+            self._retired = []
+        for http_client in http_clients:
+            http_client.close()
@@ -0,0 +1,76 @@
+# Backend otvara jedan PDF i redom daje (broj strane, tekst) od start_page nadalje, stranu po stranu;
+# za strane iz skip (već su u kešu) daje None umesto teksta i ne izvlači ih.
+# Izbor strana, oznake kraja i keš su u anki_flash.iter_pdf_pages, pa svi backend-i daju iste strane.
+
+# Podrazumevani backend; pypdfium2 je višestruko brži, a tekst je isti ili skoro isti (vidi benchmark)
+DEFAULT_PDF_BACKEND = 'pdfplumber'
+
+
+class PdfplumberBackend:
+    """pdfplumber's ``extract_text``: pure Python layout analysis, the slowest but the reference output."""
+
+    name = 'pdfplumber'
+
+    @staticmethod
+    def version():
+        import pdfplumber
+        return pdfplumber.__version__
+
+    @staticmethod
+    def iter_pages(file_path, start_page=0, skip=()):
+        import pdfplumber
+        with pdfplumber.open(file_path) as pdf:
+            for page_num, page in enumerate(pdf.pages[start_page:], start=start_page):
+                if page_num in skip:
+                    yield page_num, None
+                    continue
+                try:
+                    text = page.extract_text() or ""
+                finally:
+                    # Oslobađamo keš parsiranih objekata strane (starije verzije pdfplumber-a nemaju close)
+                    getattr(page, 'close', page.flush_cache)()
+                yield page_num, text
+
+
+class PdfiumBackend:
+    """PDFium's text layer through pypdfium2 (already installed with pdfplumber); native code, no layout pass."""
+
+    name = 'pypdfium2'
+
+    @staticmethod
+    def version():
+        from pypdfium2.version import PDFIUM_INFO, PYPDFIUM_INFO
+        return f"{PYPDFIUM_INFO}/{PDFIUM_INFO}"
+
+    @staticmethod
+    def iter_pages(file_path, start_page=0, skip=()):
+        import pypdfium2
+
+        document = pypdfium2.PdfDocument(file_path)
+        try:
+            for page_num in range(start_page, len(document)):
+                if page_num in skip:
+                    yield page_num, None
+                    continue
+                page = document[page_num]
+                text_page = page.get_textpage()
+                try:
+                    # get_text_bounded bi odsekao tekst koji izlazi van ivica strane
+                    text = text_page.get_text_range()
+                finally:
+                    text_page.close()
+                    page.close()
+                # PDFium deli redove sa \r\n i označava rastavljanje reči na kraju reda sa \x02
+                yield page_num, text.replace('\r\n', '\n').replace('\r', '\n').replace('\x02', '-').strip()
+        finally:
+            document.close()
+
+
+PDF_BACKENDS = {backend.name: backend for backend in (PdfplumberBackend, PdfiumBackend)}
+
+
+def get_pdf_backend(name=None):
+    try:
+        return PDF_BACKENDS[name or DEFAULT_PDF_BACKEND]
+    except KeyError:
+        raise ValueError(f"Unknown PDF backend {name!r}; available: {', '.join(PDF_BACKENDS)}") from None
@@ -0,0 +1,204 @@
+import os
+import time
+from email.utils import parsedate_to_datetime
+
+from cache_store import SqliteStore, make_cache_key
+
+# Koliko sekundi punog ograničenja kofa sme da nakupi; veći nalet odjednom server ionako odbije
+RATE_BURST_SECONDS = 10.0
+# Posle 429 se dozvoljena brzina prepolovi (ali ne ispod ovog dela ograničenja)...
+THROTTLE_BACKOFF = 0.5
+THROTTLE_MIN_SCALE = 0.1
+# ...a svaki uspešan zahtev je vraća za ovoliko ka punom ograničenju
+THROTTLE_RECOVERY = 0.05
+# Pauza posle 429 kad server ne pošalje Retry-After
+DEFAULT_RETRY_AFTER = 1.0
+# Najduže čekanje između dve provere kofe; drugi procesi u međuvremenu menjaju stanje
+MAX_WAIT_STEP = 1.0
+
+
+def rate_limit_retry_after(error):
+    """Seconds to wait if ``error`` is an HTTP 429 (Retry-After or ``DEFAULT_RETRY_AFTER``), None otherwise."""
+    response = getattr(error, 'raw_response', None) or getattr(error, 'response', None)
+    status = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+    message = str(error).lower()
+    if status != 429 and 'rate limit' not in message and 'status 429' not in message:
+        return None
+    value = (getattr(response, 'headers', None) or {}).get('retry-after')
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+class SharedRateBudget(SqliteStore):
+    """Requests-per-minute and tokens-per-minute token buckets shared by every process using one API key.
+
+    The buckets live in one SQLite row per API key (keyed by a hash; the
+    key itself is not stored) and are refilled and drawn inside
+    ``BEGIN IMMEDIATE``, so GUI and CLI instances on the same machine spend
+    one budget between them. ``acquire`` blocks until both buckets can
+    cover a request; ``record_success`` corrects the token bucket with the
+    real usage and ``record_throttle`` pauses everyone until Retry-After and
+    halves the rate, which recovers with every successful request after.
+
+    Limits set with ``set_limits`` are stored in the row too, so processes
+    that were not given limits of their own follow them; 0 clears a limit.
+    With no limit and no pause in effect, ``acquire`` and ``record_success``
+    only read the row and never take the write lock.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.requests_per_minute = None
+        self.tokens_per_minute = None
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_budget (
+                key TEXT PRIMARY KEY,
+                requests_per_minute REAL,
+                tokens_per_minute REAL,
+                request_level REAL NOT NULL,
+                token_level REAL NOT NULL,
+                scale REAL NOT NULL,
+                paused_until REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def set_limits(self, requests_per_minute=None, tokens_per_minute=None):
+        """Use these limits here and publish them to other processes; None keeps the shared value."""
+        if requests_per_minute is not None:
+            self.requests_per_minute = requests_per_minute
+        if tokens_per_minute is not None:
+            self.tokens_per_minute = tokens_per_minute
+        if requests_per_minute is not None or tokens_per_minute is not None:
+            self._update(lambda state, now: 0.0)
+
+    def current_limits(self):
+        """Return ``(requests_per_minute, tokens_per_minute, paused)`` in effect, read without locking."""
+        key = make_cache_key('rate_budget', os.getenv('MISTRAL_API_KEY') or '')
+        row = self._connection().execute(
+            "SELECT requests_per_minute, tokens_per_minute, paused_until FROM rate_budget WHERE key = ?",
+            (key,)).fetchone()
+        requests_per_minute, tokens_per_minute, paused_until = row or (None, None, 0.0)
+        if self.requests_per_minute is not None:
+            requests_per_minute = self.requests_per_minute or None
+        if self.tokens_per_minute is not None:
+            tokens_per_minute = self.tokens_per_minute or None
+        return requests_per_minute, tokens_per_minute, paused_until > time.time()
+
+    def acquire(self, tokens=0, cancel_token=None):
+        """Wait until one request of ``tokens`` tokens fits the budget and draw it; returns early on cancel."""
+        if not any(self.current_limits()):
+            return
+
+        def draw(state, now):
+            delay = self._delay(state, tokens, now)
+            if delay <= 0:
+                state['request_level'] -= 1
+                state['token_level'] -= tokens
+            return delay
+
+        while True:
+            delay = self._update(draw)
+            if delay <= 0:
+                return
+            delay = min(delay, MAX_WAIT_STEP)
+            if cancel_token is not None:
+                if cancel_token.wait(delay):
+                    return
+            else:
+                time.sleep(delay)
+
+    def record_success(self, estimated_tokens=0, used_tokens=None):
+        requests_per_minute, tokens_per_minute, _ = self.current_limits()
+        if not requests_per_minute and not tokens_per_minute:
+            # Bez ograničenja ni brzina posle 429 ni kofa tokena ništa ne znače
+            return
+
+        def settle(state, now):
+            if used_tokens is not None:
+                state['token_level'] += estimated_tokens - used_tokens
+            state['scale'] = min(1.0, state['scale'] + THROTTLE_RECOVERY)
+            return 0.0
+
+        self._update(settle)
+
+    def record_throttle(self, retry_after=DEFAULT_RETRY_AFTER):
+        def pause(state, now):
+            state['paused_until'] = max(state['paused_until'], now + retry_after)
+            state['scale'] = max(THROTTLE_MIN_SCALE, state['scale'] * THROTTLE_BACKOFF)
+            # Kofe se prazne, da posle pauze ne krene ceo nalet odjednom
+            state['request_level'] = min(state['request_level'], 0.0)
+            state['token_level'] = min(state['token_level'], 0.0)
+            return 0.0
+
+        self._update(pause)
+
+    def _delay(self, state, tokens, now):
+        delay = state['paused_until'] - now
+        for limit, level, amount in ((state['requests_per_minute'], state['request_level'], 1),
+                                     (state['tokens_per_minute'], state['token_level'], tokens)):
+            if not limit:
+                continue
+            # Zahtev veći od cele kofe čeka samo da se ona napuni, inače nikad ne bi prošao
+            needed = min(amount, limit * RATE_BURST_SECONDS / 60.0)
+            if level < needed:
+                delay = max(delay, (needed - level) / (limit * state['scale'] / 60.0))
+        return delay
+
+    def _update(self, change):
+        # Ključ se čita svaki put, jer GUI može da promeni API ključ usred rada
+        key = make_cache_key('rate_budget', os.getenv('MISTRAL_API_KEY') or '')
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("""
+                SELECT requests_per_minute, tokens_per_minute, request_level, token_level, scale, paused_until,
+                       updated_at
+                FROM rate_budget WHERE key = ?
+            """, (key,)).fetchone()
+            now = time.time()
+            state = self._refill(row, now)
+            result = change(state, now)
+            conn.execute("INSERT OR REPLACE INTO rate_budget VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (key, state['requests_per_minute'], state['tokens_per_minute'], state['request_level'],
+                          state['token_level'], state['scale'], state['paused_until'], now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def _refill(self, row, now):
+        if row is None:
+            state = {'requests_per_minute': None, 'tokens_per_minute': None, 'request_level': float('inf'),
+                     'token_level': float('inf'), 'scale': 1.0, 'paused_until': 0.0}
+            elapsed = 0.0
+        else:
+            keys = ('requests_per_minute', 'tokens_per_minute', 'request_level', 'token_level', 'scale',
+                    'paused_until')
+            state = dict(zip(keys, row[:6]))
+            # time.time je zajednički za sve procese, ali sat sistema može da se pomeri unazad
+            elapsed = max(0.0, now - row[6])
+        if self.requests_per_minute is not None:
+            state['requests_per_minute'] = self.requests_per_minute or None
+        if self.tokens_per_minute is not None:
+            state['tokens_per_minute'] = self.tokens_per_minute or None
+        for limit_key, level_key in (('requests_per_minute', 'request_level'), ('tokens_per_minute', 'token_level')):
+            limit = state[limit_key]
+            if not limit:
+                # Bez ograničenja je kofa puna, pa kad se ograničenje uvede prvi zahtevi ne čekaju
+                state[level_key] = float('inf')
+                continue
+            capacity = limit * RATE_BURST_SECONDS / 60.0
+            level = state[level_key]
+            state[level_key] = min(capacity, level + elapsed * limit * state['scale'] / 60.0)
+        return state
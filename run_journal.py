@@ -0,0 +1,100 @@
+import json
+import os
+
+
+class RunJournal:
+    """Append-only JSON-lines log of a generation run, used to resume it.
+
+    The first record identifies the job; after it come the chunk lists of
+    every PDF that was chunked and the cards of every finished chunk. When a
+    run is restarted with the same job id, those records are replayed so no
+    PDF is read and no API call is made twice. A journal written for a
+    different job is discarded.
+
+    Only the loaded records are kept in ``chunks`` and ``cards`` (the run
+    pops them as it replays them); new records go straight to the file.
+    """
+
+    def __init__(self, path, job_id):
+        self.path = path
+        self.job_id = job_id
+        self.chunks = {}
+        self.cards = {}
+
+        resumed = self._load()
+        self._file = open(path, 'a' if resumed else 'w', encoding='utf-8')
+        if not resumed:
+            self._append({'type': 'job', 'job_id': job_id})
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        if not lines:
+            return False
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return False
+        if header.get('type') != 'job' or header.get('job_id') != self.job_id:
+            return False
+
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Poslednji red može biti nedovršen ako je proces prekinut usred upisa
+                continue
+            if record['type'] == 'chunks':
+                self.chunks[record['pdf_index']] = record['chunks']
+            elif record['type'] == 'cards':
+                self.cards[(record['pdf_index'], record['chunk_index'])] = record['cards']
+        return True
+
+    @property
+    def resumed(self):
+        return bool(self.chunks)
+
+    def _append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def record_chunks(self, pdf_index, pdf_path, chunks):
+        self._append({'type': 'chunks', 'pdf_index': pdf_index, 'pdf_path': pdf_path, 'chunks': chunks})
+
+    def record_cards(self, pdf_index, chunk_index, cards):
+        self._append({'type': 'cards', 'pdf_index': pdf_index, 'chunk_index': chunk_index, 'cards': cards})
+
+    def close(self):
+        self._file.close()
+
+    def finish(self):
+        """Close and delete the journal once the run completed."""
+        self.close()
+        os.remove(self.path)
+
+
+class CardWriter:
+    """Streams cards to the output file as the pipeline hands them over, in deck order.
+
+    With a ``deduplicator`` (see ``dedup.CardDeduplicator``) cards repeating
+    an earlier card are skipped. Every batch is flushed, so the file always
+    holds a complete prefix of the final deck.
+    """
+
+    def __init__(self, output_path, encoding='utf-8', deduplicator=None):
+        self._file = open(output_path, 'w', encoding=encoding, newline='')
+        self._deduplicator = deduplicator
+        self.cards_written = 0
+
+    def write(self, cards):
+        for card in cards:
+            if self._deduplicator is not None and not self._deduplicator.add(card):
+                continue
+            self._file.write(card + '\n')
+            self.cards_written += 1
+        self._file.flush()
+
+    def close(self):
+        self._file.close()